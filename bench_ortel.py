@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# bench_ortel.py
+"""
+Benchmark de costo y precisión de la pila de estimadores.
+
+Mide, sobre una grilla de d, n_per_z, |z_vals|, N y N_hip:
+
+    hull      random_vertices_by_fiber + generate_convex_hull (politopos aleatorios)
+    vol_est   vol_star._fiber_vol_est en politopos de referencia (error vs volumen exacto)
+    ratio_cp  vol_star.ratio_cp en el centroide de los politopos de referencia
+              (error vs F exacto), para cada method
+    ortel     ortel.ortel en politopos de referencia (error vs F exacto) y en
+              politopos aleatorios (solo tiempo y F)
+
+Politopos de referencia: prismas P × [0, 1] con fibras z = 0, 1 iguales a P,
+construidos con generate_convex_hull como los aleatorios. Por el teorema de
+Grünbaum, en el centroide de un símplice el peor corte deja (d/(d+1))^d del
+volumen, y ese es el máximo de F:
+
+    triangle  triángulo estándar (modo triángulo de ortel_pipeline.nf)  F = 4/9
+    square    [0, 1]^2                                                  F = 1/2
+    simplex3  símplice estándar en R^3                                  F = 27/64
+
+El JSON incluye también los niveles 2/9 y 1/(2e) del análisis, y para los
+politopos aleatorios la fracción de réplicas con F bajo cada uno.
+
+Cada caso se repite --reps veces con semillas independientes (SeedSequence
+de --seed). Por caso se guarda la mediana de tiempos, el error medio (sesgo)
+y el RMSE; "curves" agrupa los casos con error en curvas error-vs-tiempo.
+
+Con --compare base.json se comparan los casos comunes con una corrida
+anterior: un caso regresiona si su tiempo mediano crece más de --tol_time
+(relativo, con un piso de 5 ms) o su RMSE crece más de --tol_err (absoluto
+por sobre el RMSE base más dos veces su error estándar). Sale con código 1
+si hay regresiones.
+
+Ejemplo:
+    python bench_ortel.py --quick --out results/bench/base.json
+    python bench_ortel.py --quick --compare results/bench/base.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import scipy
+
+from convex_hull import generate_convex_hull, random_vertices_by_fiber
+from fibers import FiberTriangulation
+from ortel import ortel
+from vol_star import _fiber_vol_est, ratio_cp
+
+LEVELS = {"2/9": 2 / 9, "1/(2e)": 1 / (2 * np.e)}
+
+REFERENCE = {
+    "triangle": [[0, 0], [1, 0], [0, 1]],
+    "square": [[0, 0], [1, 0], [0, 1], [1, 1]],
+    "simplex3": [[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]],
+}
+
+_TIME_FLOOR = 5e-3  # s: diferencias menores son ruido del reloj
+
+
+def reference_polytope(name, z_vals=(0, 1)):
+    """
+    Prisma de referencia name (ver REFERENCE) con fibras z_vals.
+
+    Devuelve dict con A, b, d, z_vals, cp (centroide en la fibra z_vals[0]),
+    F (exacto) y vol (volumen exacto de cada fibra).
+    """
+    P = np.asarray(REFERENCE[name], float)
+    d = P.shape[1]
+    verts = np.vstack([np.hstack([np.full((len(P), 1), float(z)), P]) for z in z_vals])
+    A, b = generate_convex_hull(verts, rng=0)
+    centroid = P.mean(axis=0) if name != "square" else np.full(d, 0.5)
+    return {
+        "A": A, "b": b, "d": d, "z_vals": [int(z) for z in z_vals],
+        "cp": np.concatenate([[float(z_vals[0])], centroid]),
+        "F": 0.5 if name == "square" else (d / (d + 1)) ** d,
+        "vol": FiberTriangulation(P).volume,
+    }
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def _case(bench, params, times, values=None, exact=None):
+    """Resumen de un caso: mediana de tiempos y, con exact, sesgo y RMSE."""
+    rec = {
+        "bench": bench,
+        "params": params,
+        "time_s": float(np.median(times)),
+        "times": [float(t) for t in times],
+    }
+    if values is not None:
+        v = np.asarray(values, float)
+        rec["value"] = float(v.mean())
+        rec["values"] = v.tolist()
+    if exact is not None:
+        err = v - float(exact)
+        rec["exact"] = float(exact)
+        rec["bias"] = float(err.mean())
+        rec["rmse"] = float(np.sqrt(np.mean(err**2)))
+        rec["rmse_se"] = (float(np.std(err**2, ddof=1) / (2 * rec["rmse"] * np.sqrt(len(err))))
+                          if len(err) > 1 and rec["rmse"] > 0 else 0.0)
+    return rec
+
+
+def bench_hull(args, ss):
+    out = []
+    for d in args.d:
+        for n_per_z in args.n_per_z:
+            for nz in args.nz:
+                times, n_facets = [], []
+                for s in ss.spawn(args.reps):
+                    rng = np.random.default_rng(s)
+
+                    def _run():
+                        verts = random_vertices_by_fiber(range(nz), d, n_per_z, rng=rng)
+                        return generate_convex_hull(verts, rng=rng)
+
+                    (A, _), t = _timed(_run)
+                    times.append(t)
+                    n_facets.append(A.shape[0])
+                out.append(_case("hull", {"d": d, "n_per_z": n_per_z, "nz": nz},
+                                 times, n_facets))
+    return out
+
+
+def bench_vol_est(args, ss):
+    out = []
+    for name in args.refs:
+        ref = reference_polytope(name)
+        for sampler in args.samplers:
+            for N in args.N:
+                times, vals = [], []
+                for s in ss.spawn(args.reps):
+                    v, t = _timed(lambda: _fiber_vol_est(
+                        ref["d"], ref["A"], ref["b"], 0, N, sampler=sampler,
+                        rng=np.random.default_rng(s)))
+                    times.append(t)
+                    vals.append(v)
+                out.append(_case("vol_est", {"ref": name, "sampler": sampler, "N": N},
+                                 times, vals, exact=ref["vol"]))
+    return out
+
+
+def bench_ratio_cp(args, ss):
+    out = []
+    for name in args.refs:
+        ref = reference_polytope(name)
+        methods = [m for m in args.methods if ref["d"] == 2 or m != "sweep"]
+        for method in methods:
+            for N in (args.N if method in ("indep", "pool") else args.N[:1]):
+                for N_hip in (args.N_hip if method != "sweep" else args.N_hip[:1]):
+                    times, vals = [], []
+                    for s in ss.spawn(args.reps):
+                        (F, _), t = _timed(lambda: ratio_cp(
+                            ref["A"], ref["b"], ref["cp"], ref["z_vals"], N_hip, ref["d"], N,
+                            method=method, rng=np.random.default_rng(s)))
+                        times.append(t)
+                        vals.append(F)
+                    out.append(_case("ratio_cp", {"ref": name, "method": method, "N": N,
+                                                  "N_hip": N_hip},
+                                     times, vals, exact=ref["F"]))
+    return out
+
+
+def bench_ortel(args, ss):
+    out = []
+    kw = dict(N_cp=args.N_cp, method=args.ortel_method, search=args.search)
+
+    for name in args.refs:
+        ref = reference_polytope(name)
+        method = kw["method"] if ref["d"] == 2 or kw["method"] != "sweep" else "pool"
+        for N in args.N:
+            for N_hip in args.N_hip:
+                times, vals = [], []
+                for s in ss.spawn(args.reps):
+                    (_, F, _), t = _timed(lambda: ortel(
+                        ref["A"], ref["b"], ref["d"], z_vals=ref["z_vals"], N_hip=N_hip, N=N,
+                        **dict(kw, method=method), rng=np.random.default_rng(s)))
+                    times.append(t)
+                    vals.append(F)
+                out.append(_case("ortel", {"ref": name, "method": method, "N": N,
+                                           "N_hip": N_hip, "N_cp": args.N_cp},
+                                 times, vals, exact=ref["F"]))
+
+    for d in args.d:
+        method = kw["method"] if d == 2 or kw["method"] != "sweep" else "pool"
+        for n_per_z in args.n_per_z:
+            for nz in args.nz:
+                for N in args.N:
+                    for N_hip in args.N_hip:
+                        times, vals = [], []
+                        for s in ss.spawn(args.reps):
+                            s_hull, s_search = s.spawn(2)
+                            rng_hull = np.random.default_rng(s_hull)
+                            verts = random_vertices_by_fiber(range(nz), d, n_per_z, rng=rng_hull)
+                            A, b = generate_convex_hull(verts, rng=rng_hull)
+                            (_, F, _), t = _timed(lambda: ortel(
+                                A, b, d, z_vals=list(range(nz)), N_hip=N_hip, N=N,
+                                **dict(kw, method=method),
+                                rng=np.random.default_rng(s_search)))
+                            times.append(t)
+                            vals.append(F)
+                        rec = _case("ortel", {"d": d, "n_per_z": n_per_z, "nz": nz,
+                                              "method": method, "N": N, "N_hip": N_hip,
+                                              "N_cp": args.N_cp},
+                                    times, vals)
+                        rec["below"] = {k: float(np.mean(np.asarray(vals) < v))
+                                        for k, v in LEVELS.items()}
+                        out.append(rec)
+    return out
+
+
+BENCHES = {"hull": bench_hull, "vol_est": bench_vol_est, "ratio_cp": bench_ratio_cp,
+           "ortel": bench_ortel}
+
+
+def curves(cases):
+    """Curvas error-vs-tiempo: casos con error agrupados por todo salvo N y N_hip."""
+    groups = {}
+    for c in cases:
+        if "rmse" not in c:
+            continue
+        key = {k: v for k, v in c["params"].items() if k not in ("N", "N_hip")}
+        name = c["bench"] + ":" + ",".join(f"{k}={v}" for k, v in sorted(key.items()))
+        groups.setdefault(name, []).append({
+            "N": c["params"].get("N"), "N_hip": c["params"].get("N_hip"),
+            "time_s": c["time_s"], "rmse": c["rmse"], "bias": c["bias"],
+        })
+    return {k: sorted(v, key=lambda p: p["time_s"]) for k, v in groups.items()}
+
+
+def _case_key(c):
+    return c["bench"] + json.dumps(c["params"], sort_keys=True)
+
+
+def compare(cases, base, tol_time=0.25, tol_err=0.01):
+    """Regresiones de cases respecto de base (lista de casos de otra corrida)."""
+    old = {_case_key(c): c for c in base}
+    regressions = []
+    for c in cases:
+        o = old.get(_case_key(c))
+        if o is None:
+            continue
+        dt = c["time_s"] - o["time_s"]
+        if dt > _TIME_FLOOR and c["time_s"] > o["time_s"] * (1 + tol_time):
+            regressions.append({"case": _case_key(c), "kind": "time",
+                                "old": o["time_s"], "new": c["time_s"]})
+        if "rmse" in c and "rmse" in o:
+            limit = o["rmse"] + 2 * o.get("rmse_se", 0.0) + tol_err
+            if c["rmse"] > limit:
+                regressions.append({"case": _case_key(c), "kind": "error",
+                                    "old": o["rmse"], "new": c["rmse"]})
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=Path(__file__).resolve().parent,
+            capture_output=True, text=True, timeout=10, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_parser():
+    p = argparse.ArgumentParser(description="Benchmark de tiempo y precisión de los estimadores.")
+    p.add_argument("--bench", nargs="+", choices=list(BENCHES), default=list(BENCHES))
+    p.add_argument("--d", nargs="+", type=int, default=[2, 3], help="dimensiones (politopos aleatorios)")
+    p.add_argument("--n_per_z", nargs="+", type=int, default=[5, 10])
+    p.add_argument("--nz", nargs="+", type=int, default=[2, 3], help="número de fibras |z_vals|")
+    p.add_argument("--N", nargs="+", type=int, default=[2000, 8000, 32000])
+    p.add_argument("--N_hip", nargs="+", type=int, default=[50, 200])
+    p.add_argument("--N_cp", type=int, default=10)
+    p.add_argument("--refs", nargs="+", choices=list(REFERENCE), default=list(REFERENCE))
+    p.add_argument("--methods", nargs="+", choices=["indep", "pool", "exact", "sweep"],
+                   default=["indep", "pool", "exact", "sweep"], help="métodos de ratio_cp")
+    p.add_argument("--samplers", nargs="+", choices=["mc", "sobol", "halton"],
+                   default=["mc", "sobol"], help="samplers de _fiber_vol_est")
+    p.add_argument("--ortel_method", choices=["indep", "pool", "exact", "sweep"], default="pool")
+    p.add_argument("--search", choices=["random", "racing"], default="random")
+    p.add_argument("--reps", type=int, default=3, help="repeticiones por caso")
+    p.add_argument("--seed", type=int, default=0, help="entropía de la SeedSequence raíz")
+    p.add_argument("--quick", action="store_true",
+                   help="grilla chica (d=2, n_per_z=5, nz=2, N=2000 8000, N_hip=50)")
+    p.add_argument("--out", type=Path, default=None,
+                   help="JSON de salida (por defecto results/bench/bench_<timestamp>.json)")
+    p.add_argument("--compare", type=Path, default=None, help="JSON de una corrida anterior")
+    p.add_argument("--tol_time", type=float, default=0.25,
+                   help="aumento relativo de tiempo tolerado en --compare")
+    p.add_argument("--tol_err", type=float, default=0.01,
+                   help="aumento absoluto de RMSE tolerado en --compare")
+    return p
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.quick:
+        args.d, args.n_per_z, args.nz = [2], [5], [2]
+        args.N, args.N_hip = [2000, 8000], [50]
+        args.refs = [r for r in args.refs if r != "simplex3"]
+
+    root = np.random.SeedSequence(args.seed)
+    cases = []
+    t0 = time.perf_counter()
+    for name, s in zip(args.bench, root.spawn(len(args.bench))):
+        t = time.perf_counter()
+        cases.extend(BENCHES[name](args, s))
+        print(f"[{name}] {time.perf_counter() - t:.1f} s")
+
+    for c in cases:
+        par = " ".join(f"{k}={v}" for k, v in c["params"].items())
+        err = f"  rmse={c['rmse']:.4f} bias={c['bias']:+.4f}" if "rmse" in c else ""
+        val = f"  value={c['value']:.4f}" if "value" in c else ""
+        print(f"  {c['bench']:<8} {par:<55} {c['time_s'] * 1e3:9.1f} ms{val}{err}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().strftime("%Y%m%d%H%M%S"),
+            "git_commit": _git_commit(),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "cpus": os.cpu_count(),
+            "args": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+            "t_total": time.perf_counter() - t0,
+        },
+        "levels": LEVELS,
+        "reference": {k: reference_polytope(k)["F"] for k in REFERENCE},
+        "cases": cases,
+        "curves": curves(cases),
+    }
+
+    rc = 0
+    if args.compare is not None:
+        base = json.loads(args.compare.read_text(encoding="utf-8"))
+        report["regressions"] = compare(cases, base["cases"], args.tol_time, args.tol_err)
+        report["meta"]["compared_to"] = str(args.compare)
+        for r in report["regressions"]:
+            print(f"[REGRESIÓN] {r['kind']}: {r['case']}  {r['old']:.4g} → {r['new']:.4g}")
+        n_common = len({_case_key(c) for c in cases} & {_case_key(c) for c in base["cases"]})
+        print(f"{len(report['regressions'])} regresiones en {n_common} casos comunes")
+        rc = 1 if report["regressions"] else 0
+
+    out = args.out or Path("results") / "bench" / f"bench_{report['meta']['timestamp']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=1), encoding="utf-8")
+    print(f"[OK] {len(cases)} casos → {out}")
+    return rc
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
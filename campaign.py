@@ -0,0 +1,134 @@
+# campaign.py
+"""
+Manifiesto de una campaña de réplicas, para poder cortarla y retomarla.
+
+    <dir>/manifest.json       parámetros fijos, semilla raíz y lista de réplicas
+                              (id, n_per_z, r); se escribe una sola vez.
+    <dir>/status_<shard>.jsonl una línea por réplica terminada (ok, partial o err),
+                              solo de ese shard: cada proceso agrega a su propio
+                              archivo, sin locks entre shards.
+    <dir>/ckpt/<id>.json      checkpoint de la búsqueda de una réplica cortada
+                              por tiempo (ver ortel.ortel).
+
+Una réplica está completa si alguna línea de estado la marca "ok"; al retomar
+solo se corren las que faltan (las "partial" siguen desde su checkpoint).
+Con SLURM_ARRAY_TASK_ID las réplicas se reparten entre los shards del array
+(réplica i → shard i mod n_shards).
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+MANIFEST = "manifest.json"
+
+
+def replica_id(n_per_z, r):
+    """Identificador estable de una réplica."""
+    return f"np{int(n_per_z)}_r{int(r):05d}"
+
+
+def load_or_create(camp_dir, params, points_and_reps, seed=None):
+    """
+    Lee el manifiesto de camp_dir o lo crea con params (dict JSON), las réplicas
+    de points_and_reps ({n_per_z: reps}) y la semilla raíz seed (None: entropía
+    del sistema, que queda guardada).
+
+    Si ya existe, sus parámetros y su semilla mandan y deben coincidir con
+    params (y con seed, si se da): retomar con otros mezclaría réplicas de
+    experimentos distintos.
+    Réplicas nuevas en points_and_reps (más reps o más n_per_z) se agregan.
+
+    Devuelve el manifiesto (dict con "params", "seed", "replicas").
+    """
+    camp_dir = Path(camp_dir)
+    camp_dir.mkdir(parents=True, exist_ok=True)
+    path = camp_dir / MANIFEST
+    params = json.loads(json.dumps(params))  # normaliza tuplas, claves, etc.
+
+    if path.exists():
+        man = json.loads(path.read_text(encoding="utf-8"))
+        if man["params"] != params:
+            diff = sorted(k for k in set(man["params"]) | set(params)
+                          if man["params"].get(k) != params.get(k))
+            raise ValueError(f"{path} tiene otros parámetros ({', '.join(diff)}); "
+                             f"usa otra campaña o los mismos parámetros.")
+        if seed is not None and int(seed) != int(man["seed"]):
+            raise ValueError(f"{path} tiene seed={man['seed']} (pedida: {seed}).")
+    else:
+        man = {"params": params, "seed": int(np.random.SeedSequence(seed).entropy),
+               "replicas": []}
+
+    known = {rep["id"] for rep in man["replicas"]}
+    added = False
+    for n_per_z, reps in points_and_reps.items():
+        for r in range(int(reps)):
+            rid = replica_id(n_per_z, r)
+            if rid not in known:
+                man["replicas"].append({"id": rid, "n_per_z": int(n_per_z), "r": r})
+                added = True
+
+    if added or not path.exists():
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(man, indent=1), encoding="utf-8")
+        if path.exists():
+            os.replace(tmp, path)
+        else:
+            # creación exclusiva: si otro shard lo creó primero, mandan los suyos
+            try:
+                os.link(tmp, path)
+            except FileExistsError:
+                return load_or_create(camp_dir, params, points_and_reps, seed=seed)
+            finally:
+                tmp.unlink(missing_ok=True)
+    return man
+
+
+def completed(camp_dir):
+    """ids de réplicas con estado "ok" en cualquier shard."""
+    done = set()
+    for f in Path(camp_dir).glob("status_*.jsonl"):
+        for line in f.read_text(encoding="utf-8").splitlines():
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # línea cortada por un corte de la asignación
+            if rec.get("status") == "ok":
+                done.add(rec["id"])
+    return done
+
+
+def append_status(camp_dir, shard, record):
+    """Agrega una línea JSON al archivo de estado del shard."""
+    path = Path(camp_dir) / f"status_{shard}.jsonl"
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write(json.dumps(record) + "\n")
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+def slurm_shard(environ=None):
+    """
+    (shard, n_shards) a partir de las variables de un job array de SLURM;
+    (0, 1) fuera de un array.
+    """
+    env = os.environ if environ is None else environ
+    if "SLURM_ARRAY_TASK_ID" not in env:
+        return 0, 1
+    task = int(env["SLURM_ARRAY_TASK_ID"])
+    lo = int(env.get("SLURM_ARRAY_TASK_MIN", 0))
+    if "SLURM_ARRAY_TASK_COUNT" in env:
+        n = int(env["SLURM_ARRAY_TASK_COUNT"])
+    else:
+        n = int(env.get("SLURM_ARRAY_TASK_MAX", task)) - lo + 1
+    return task - lo, max(1, n)
+
+
+def pending(man, camp_dir, shard=0, n_shards=1):
+    """Réplicas del shard que todavía no están completas, en orden del manifiesto."""
+    done = completed(camp_dir)
+    return [
+        rep for i, rep in enumerate(man["replicas"])
+        if i % n_shards == shard and rep["id"] not in done
+    ]
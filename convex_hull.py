@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
 import numpy as np
+from scipy.optimize import linprog
 from scipy.spatial import ConvexHull, QhullError
 
+import profiling
+from fibers import _fiber_halfspaces
+from samplers import make_rng
 
-def random_vertices_by_fiber(z_vals, d: int, n_per_z: int) -> np.ndarray:
+
+def random_vertices_by_fiber(z_vals, d: int, n_per_z: int, rng=None) -> np.ndarray:
     """
     Genera puntos aleatorios por fibra.
 
@@ -15,6 +20,8 @@ def random_vertices_by_fiber(z_vals, d: int, n_per_z: int) -> np.ndarray:
         Dimensión continua.
     n_per_z : int
         Número de puntos a generar por cada fibra z.
+    rng     : numpy.random.Generator, int, SeedSequence o None
+        Fuente de aleatoriedad (ver samplers.make_rng).
 
     Retorna
     -------
@@ -23,11 +30,12 @@ def random_vertices_by_fiber(z_vals, d: int, n_per_z: int) -> np.ndarray:
     """
     # Permitir z escalar o lista
     z_list = [float(z_vals)] if np.isscalar(z_vals) else [float(z) for z in z_vals]
+    rng = make_rng(rng)
 
     blocks = []
     for z in z_list:
         # puntos continuos en [0,1]^d
-        p = np.random.rand(n_per_z, d)           # (n_per_z, d)
+        p = rng.random((n_per_z, d))             # (n_per_z, d)
         # columna z constante
         zcol = np.full((n_per_z, 1), float(z))   # (n_per_z, 1)
         # concatenar (z | p)
@@ -37,7 +45,62 @@ def random_vertices_by_fiber(z_vals, d: int, n_per_z: int) -> np.ndarray:
     return verts
 
 
-def generate_convex_hull(verts: np.ndarray, tol_jitter: float = 1e-12):
+def _merge_coplanar(A, b, verts, merge_tol):
+    """
+    Une las filas de (A, b) cuyas normales y términos independientes difieren en
+    <= merge_tol (las caras que QJ triangula y mueve apenas). Cada grupo queda
+    con la normal de su primera fila y b = max_v a·v sobre los vértices originales.
+    """
+    E = np.hstack([A, b[:, None]])
+    keep = []
+    used = np.zeros(A.shape[0], dtype=bool)
+    for i in range(A.shape[0]):
+        if used[i]:
+            continue
+        used |= np.abs(E - E[i]).max(axis=1) <= merge_tol
+        keep.append(i)
+    A = A[keep]
+    return A, (verts @ A.T).max(axis=0)
+
+
+def _drop_redundant(A, b, verts, z_vals, tol, merge_tol):
+    """
+    Quita, una a una, las filas que no cambian ninguna fibra S_z (z en z_vals):
+    la fila i es redundante en z si max a_i·p sobre S_z sin la fila i (un LP)
+    no supera su lado derecho. Las fibras se cortan con el cubo [0,1]^d, como
+    en fibers._fiber_halfspaces.
+
+    Una cara con vértices a ambos lados de alguna fibra la corta en su interior
+    y se conserva sin LP.
+    """
+    d = A.shape[1] - 1
+    z_arr = np.asarray(z_vals, dtype=float)
+    tight = np.abs(verts @ A.T - b) <= merge_tol                # (n_verts, #ineq)
+    active = np.ones(A.shape[0], dtype=bool)
+    for i in range(A.shape[0]):
+        zt = verts[tight[:, i], 0]
+        if zt.size and np.any((z_arr > zt.min()) & (z_arr < zt.max())):
+            continue
+        active[i] = False
+        needed = False
+        for z in z_vals:
+            G, h = _fiber_halfspaces(A[active], b[active], z, d, tol=tol)
+            ai = A[i, 1:]
+            hi = b[i] - A[i, 0] * float(int(z)) + tol
+            res = linprog(-ai, A_ub=G, b_ub=h, bounds=[(None, None)] * d, method="highs")
+            if res.status == 2:          # S_z vacía aun sin la fila i
+                continue
+            if not res.success or -res.fun > hi + tol:
+                needed = True
+                break
+        active[i] = needed
+    return A[active], b[active]
+
+
+@profiling.timed("generate_convex_hull")
+def generate_convex_hull(verts: np.ndarray, tol_jitter: float = 1e-12, rng=None,
+                         minimal: bool = False, z_vals=None, merge_tol: float = 1e-6,
+                         tol: float = 1e-9, return_vertices: bool = False):
     """
     Construye la envolvente convexa de los vértices 'verts' y devuelve (A, b)
     tal que el poliedro es { x : A x <= b }.
@@ -45,30 +108,69 @@ def generate_convex_hull(verts: np.ndarray, tol_jitter: float = 1e-12):
     Usa QJ (joggle) para lidiar con degeneraciones. Si aún así Qhull falla,
     aplica un pequeño jitter a las coordenadas continuas (no a z) y reintenta.
 
+    Con QJ cada cara sale triangulada, así que A trae muchas filas casi
+    repetidas. Con minimal=True la descripción se reduce:
+      1) se unen las filas coplanares (normal y b a menos de merge_tol) y b se
+         recalcula como max a·v sobre los vértices originales;
+      2) se quitan las filas redundantes en todas las fibras de z_vals (LP por
+         fila y fibra), con la misma tolerancia tol que las pruebas de
+         pertenencia.
+    El resultado describe las mismas fibras S_z (no necesariamente el mismo
+    poliedro entre fibras), que es lo único que usa ortel; las filas quedan en
+    orden lexicográfico.
+
     Parámetros
     ----------
     verts      : np.ndarray, shape (N, 1+d)
         Vértices, donde la primera coordenada es z y las d restantes son continuas.
     tol_jitter : float
         Escala del jitter gaussiano para el fallback.
+    rng        : numpy.random.Generator, int, SeedSequence o None
+        Fuente del jitter (ver samplers.make_rng).
+    minimal    : bool
+        Reduce (A, b) como se describe arriba.
+    z_vals     : iterable de ints o None
+        Fibras que deben conservarse con minimal=True (por defecto, los z de verts).
+    merge_tol  : float
+        Tolerancia para unir filas coplanares.
+    tol        : float
+        Holgura de la pertenencia (la de ortel) al decidir redundancia.
+    return_vertices : bool
+        Si es True, devuelve también los vértices de la envolvente (filas de verts).
 
     Retorna
     -------
     A : np.ndarray, shape (#ineq, 1+d)
     b : np.ndarray, shape (#ineq,)
         Descripción H: { x : A x <= b }.
+    V : np.ndarray, shape (#vert, 1+d), solo con return_vertices=True
     """
+    verts = np.asarray(verts, dtype=float)
     try:
         hull = ConvexHull(verts, qhull_options="QJ")
     except QhullError:
         # Fallback: metemos jitter sólo en las coords continuas (columnas 1: )
+        profiling.count("qhull_jitter")
         v = verts.copy()
         if v.shape[1] >= 2:
-            noise = tol_jitter * np.random.randn(*v[:, 1:].shape)
+            noise = tol_jitter * make_rng(rng).standard_normal(v[:, 1:].shape)
             v[:, 1:] = np.clip(v[:, 1:] + noise, 0.0, 1.0)
         hull = ConvexHull(v, qhull_options="QJ")
 
     # ecuaciones de las caras: normales y término independiente
     A = hull.equations[:, :-1]
     b = -hull.equations[:, -1]
+
+    if minimal:
+        profiling.value("n_ineq_raw", A.shape[0])
+        if z_vals is None:
+            z_vals = np.unique(verts[:, 0])
+        A, b = _merge_coplanar(A, b, verts, merge_tol)
+        A, b = _drop_redundant(A, b, verts, [int(z) for z in z_vals], tol, merge_tol)
+        order = np.lexsort(np.hstack([A, b[:, None]]).T[::-1])
+        A, b = A[order], b[order]
+
+    profiling.value("n_ineq", A.shape[0])
+    if return_vertices:
+        return A, b, verts[np.sort(hull.vertices)]
     return A, b
@@ -0,0 +1,282 @@
+# fibers.py
+"""
+Geometría explícita de las fibras S_z = { p ∈ [0,1]^d : Ap p <= b - a0·z }.
+
+- fiber_vertices: vértices de S_z (poly2d en d = 2, HalfspaceIntersection en general).
+- fiber_bbox: caja alineada a los ejes que contiene a S_z.
+- FiberTriangulation: triangulación de S_z en símplices para muestrear
+  uniformemente dentro de la fibra (sin rechazo) y obtener su volumen exacto.
+- FiberPolytope: volumen exacto de S_z y de sus cortes por hiperplanos
+  (ConvexHull.volume), para ratio_cp(method="exact") en d != 2.
+"""
+from itertools import combinations
+
+import numpy as np
+from scipy.optimize import linprog
+from scipy.spatial import ConvexHull, Delaunay, HalfspaceIntersection, QhullError
+
+from poly2d import fiber_polygon
+from samplers import make_rng
+
+
+def _fiber_halfspaces(A, b, z, d, tol=1e-9):
+    """Semiespacios (G, h) con G p <= h: las filas de A en la fibra z más el cubo [0,1]^d."""
+    A = np.asarray(A, float)
+    b = np.asarray(b, float)
+    Ap = A[:, 1:]
+    b_shift = b - A[:, 0] * float(int(z)) + tol
+    eye = np.eye(d)
+    G = np.vstack([Ap, -eye, eye])
+    h = np.concatenate([b_shift, np.zeros(d), np.ones(d)])
+    return G, h
+
+
+def _chebyshev_center(G, h):
+    """Centro y radio de la mayor bola dentro de {G p <= h} (None, 0.0 si es vacío)."""
+    d = G.shape[1]
+    norms = np.linalg.norm(G, axis=1)
+    c = np.zeros(d + 1)
+    c[-1] = -1.0                                   # maximizar r
+    res = linprog(
+        c, A_ub=np.hstack([G, norms[:, None]]), b_ub=h,
+        bounds=[(None, None)] * d + [(0, None)], method="highs",
+    )
+    if not res.success:
+        return None, 0.0
+    return res.x[:d], float(res.x[-1])
+
+
+def _merge_close(V, tol):
+    """Une los puntos a distancia (norma infinito) <= tol; queda el primero de cada grupo."""
+    keep = []
+    used = np.zeros(V.shape[0], dtype=bool)
+    for i in range(V.shape[0]):
+        if used[i]:
+            continue
+        used |= np.abs(V - V[i]).max(axis=1) <= tol
+        keep.append(i)
+    return V[keep]
+
+
+def fiber_vertices(A, b, z, d, tol=1e-9, min_radius=1e-12, merge_tol=1e-7):
+    """
+    Vértices (k, d) de S_z. Devuelve (0, d) si la fibra es vacía o no tiene
+    interior (radio de Chebyshev <= min_radius, o del orden de la holgura tol:
+    una fibra plana, como la de d puntos en R^d, engordada por tol).
+
+    Qhull entrega cada vértice repetido muchas veces a distancias del orden de
+    tol (la holgura de cada semiespacio, más el joggle de QJ en A); los puntos a
+    menos de merge_tol se unen en uno.
+
+    Si HalfspaceIntersection falla por precisión (fibras casi degeneradas) se
+    reintenta con "Q12" y con "QJ"; si aun así falla devuelve None: la fibra
+    existe pero sus vértices no se pudieron calcular, y quien llama debe
+    tratarla solo con muestreo por rechazo.
+    """
+    d = int(d)
+    if d == 2:
+        return fiber_polygon(A, b, z, tol=tol)
+
+    G, h = _fiber_halfspaces(A, b, z, d, tol=tol)
+    x0, r = _chebyshev_center(G, h)
+    if x0 is None or r <= max(min_radius, 10.0 * tol):
+        return np.empty((0, d), dtype=float)
+
+    H = np.hstack([G, -h[:, None]])
+    for opts in (None, "Qx Q12" if d > 4 else "Q12", "QJ"):
+        try:
+            hs = HalfspaceIntersection(H, x0, qhull_options=opts)
+            break
+        except QhullError:
+            continue
+    else:
+        return None
+    V = hs.intersections
+    V = V[np.all(np.isfinite(V), axis=1)]
+    # Qhull repite vértices degenerados (más de d facetas activas)
+    return _merge_close(V, merge_tol)
+
+
+def fiber_bbox(A, b, z, d, tol=1e-9):
+    """
+    Caja (lo, hi) alineada a los ejes, dentro de [0,1]^d, que contiene a S_z.
+    En d = 2 sale del polígono; en general, de 2d LPs (min y max de cada coordenada).
+    Devuelve None si la fibra es vacía.
+    """
+    d = int(d)
+    if d == 2:
+        P = fiber_polygon(A, b, z, tol=tol)
+        if P.shape[0] == 0:
+            return None
+        return np.clip(P.min(axis=0), 0.0, 1.0), np.clip(P.max(axis=0), 0.0, 1.0)
+
+    G, h = _fiber_halfspaces(A, b, z, d, tol=tol)
+    lo = np.zeros(d)
+    hi = np.ones(d)
+    for j in range(d):
+        c = np.zeros(d)
+        for sign in (1.0, -1.0):
+            c[j] = sign
+            res = linprog(c, A_ub=G, b_ub=h, bounds=[(None, None)] * d, method="highs")
+            if not res.success:
+                return None
+            if sign > 0:
+                lo[j] = res.x[j]
+            else:
+                hi[j] = res.x[j]
+    return np.clip(lo, 0.0, 1.0), np.clip(hi, 0.0, 1.0)
+
+
+class FiberTriangulation:
+    """
+    Triangulación de un politopo convexo dado por sus vértices.
+
+    Atributos
+    ---------
+    volume : float
+        Volumen exacto (suma de volúmenes de los símplices).
+    valid : bool
+        False si no hay triangulación (verts=None, ver fiber_vertices, o Qhull
+        falló también con QJ); entonces volume = 0 no dice nada de la fibra.
+    """
+
+    def __init__(self, verts, d=None):
+        d = int(d) if verts is None else np.shape(verts)[1]
+        self.d = d
+        self.simplices = np.empty((0, d + 1, d), dtype=float)
+        self.volume = 0.0
+        self.valid = verts is not None
+        self._cum = np.empty(0)
+
+        if verts is None:
+            return
+        verts = np.asarray(verts, float)
+        if verts.shape[0] < d + 1:
+            return
+        tri = _qhull(Delaunay, verts)
+        if tri is None:
+            self.valid = False
+            return
+
+        S = verts[tri.simplices]                            # (n_simp, d+1, d)
+        E = S[:, 1:, :] - S[:, :1, :]                       # (n_simp, d, d)
+        fact = float(np.prod(np.arange(1, d + 1)))
+        vols = np.abs(np.linalg.det(E)) / fact
+        keep = vols > 0
+        if not keep.any():
+            return
+
+        self.simplices = S[keep]
+        vols = vols[keep]
+        self.volume = float(vols.sum())
+        self._cum = np.cumsum(vols) / self.volume
+
+    def sample(self, m, rng=None):
+        """m puntos uniformes en el politopo: símplice ∝ volumen, luego Dirichlet(1,...,1)."""
+        m = int(m)
+        if self.volume <= 0 or m <= 0:
+            return np.empty((0, self.d), dtype=float)
+        rng = make_rng(rng)
+        idx = np.searchsorted(self._cum, rng.random(m), side="right")
+        idx = np.minimum(idx, self.simplices.shape[0] - 1)
+        W = rng.standard_exponential((m, self.d + 1))       # Exp(1)
+        W /= W.sum(axis=1, keepdims=True)
+        return np.einsum("mk,mkd->md", W, self.simplices[idx])
+
+
+def _qhull(cls, pts):
+    """cls(pts) (ConvexHull o Delaunay); si Qhull falla se reintenta con QJ y si no, None."""
+    for opts in (None, "QJ"):
+        try:
+            return cls(pts, qhull_options=opts)
+        except QhullError:
+            continue
+    return None
+
+
+def _hull_volume(pts, d):
+    """
+    Volumen de conv(pts); 0 si hay menos de d + 1 puntos o son coplanares. Si
+    Qhull falla por precisión (cortes muy delgados) se reintenta con QJ.
+    """
+    if pts.shape[0] < d + 1:
+        return 0.0
+    hull = _qhull(ConvexHull, pts)
+    return 0.0 if hull is None else float(hull.volume)
+
+
+class FiberPolytope:
+    """
+    Politopo convexo dado por sus vértices, con volumen exacto y volúmenes de
+    sus cortes por hiperplanos.
+
+    El corte S ∩ {(x - p)·u >= 0} es conv(vértices de ese lado ∪ cruces de las
+    aristas con el hiperplano): los vértices y las aristas se calculan una vez
+    (las aristas salen de la triangulación de la frontera que entrega Qhull) y
+    cada corte cuesta un ConvexHull de unas decenas de puntos.
+
+    Atributos
+    ---------
+    volume : float
+        Volumen exacto (0 si el politopo no tiene interior).
+    valid : bool
+        Como en FiberTriangulation: False si no hay vértices o envolvente.
+    """
+
+    def __init__(self, verts, d=None):
+        d = int(d) if verts is None else np.shape(verts)[1]
+        self.d = d
+        self.verts = np.empty((0, d), dtype=float) if verts is None else np.asarray(verts, float)
+        self.edges = np.empty((0, 2), dtype=np.int64)
+        self.volume = 0.0
+        self.valid = verts is not None
+
+        verts = self.verts
+        if verts.shape[0] < d + 1:
+            return
+        hull = _qhull(ConvexHull, verts)
+        if hull is None:
+            self.valid = False
+            return
+
+        self.volume = float(hull.volume)
+        # solo los vértices de la envolvente, reindexados
+        self.verts = verts[hull.vertices]
+        idx = np.full(verts.shape[0], -1, dtype=np.int64)
+        idx[hull.vertices] = np.arange(hull.vertices.size)
+        pairs = idx[hull.simplices][:, list(combinations(range(d), 2))].reshape(-1, 2)
+        self.edges = np.unique(np.sort(pairs, axis=1), axis=0)
+
+    def cut_volumes(self, p, U):
+        """
+        Vol(S ∩ {(x - p)·u >= 0}) para cada columna u de U (d, n_dir).
+        Se arma el lado con menos vértices y el otro sale por diferencia.
+        """
+        n_dir = U.shape[1]
+        out = np.zeros(n_dir, dtype=float)
+        if self.volume <= 0:
+            return out
+
+        V = self.verts
+        i, j = self.edges.T
+        S = (V - p) @ U                                      # (k, n_dir)
+        for c in range(n_dir):
+            s = S[:, c]
+            pos = s >= 0
+            n_pos = int(pos.sum())
+            if n_pos == 0:
+                continue
+            if not (s < 0).any():
+                out[c] = self.volume
+                continue
+
+            si, sj = s[i], s[j]
+            cross = ((si > 0) & (sj < 0)) | ((si < 0) & (sj > 0))
+            t = si[cross] / (si[cross] - sj[cross])
+            X = V[i[cross]] + t[:, None] * (V[j[cross]] - V[i[cross]])
+
+            if n_pos <= V.shape[0] - n_pos:
+                out[c] = _hull_volume(np.vstack([V[pos], X]), self.d)
+            else:
+                out[c] = self.volume - _hull_volume(np.vstack([V[s <= 0], X]), self.d)
+        return np.clip(out, 0.0, self.volume)
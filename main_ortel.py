@@ -1,18 +1,22 @@
 #!/usr/bin/env python3
-# main_ortel.py (seedless, NPZ-only, routing por F)
+# main_ortel.py (SeedSequence, NPZ-only, routing por F)
 import argparse
+import time
 from pathlib import Path
 from datetime import datetime
 import numpy as np
 
 from convex_hull import random_vertices_by_fiber, generate_convex_hull
+import profiling
 from ortel import ortel  # versión que ahora devuelve bestCP, bestF, bestU
+from result_store import ResultStore
+from vol_star import check_method
 
 
 def build_parser():
     p = argparse.ArgumentParser(
         description=(
-            "Experimento Oertel (seedless) → guarda NPZ con A, b, F, bestcp, best_u "
+            "Experimento Oertel → guarda NPZ con A, b, F, bestcp, best_u "
             "y vértices, separando entre hulls y hulls_obs según F."
         )
     )
@@ -25,19 +29,132 @@ def build_parser():
     p.add_argument("--N_hip", type=int, required=True, help="hiperplanos para evaluar el peor corte")
     p.add_argument("--f_threshold", type=float, default=0.18, help="umbral F para enrutar hulls vs hulls_obs")
     p.add_argument("--target_mb", type=float, default=None, help="MiB objetivo para batches internos")
+    p.add_argument("--method", choices=["indep", "pool", "exact", "sweep"], default="indep",
+                   help="evaluación en ratio_cp: lotes nuevos por dirección (indep), muestra común "
+                        "por fibra (pool), volúmenes exactos de fibras y cortes (exact) o áreas exactas "
+                        "con mínimo exacto sobre el ángulo (sweep, solo d=2)")
+    p.add_argument("--sampler", choices=["mc", "sobol", "halton", "direct"], default="mc",
+                   help="secuencia de puntos para los estimadores: Monte Carlo (mc), QMC aleatorizado "
+                        "(sobol, halton) o uniforme dentro de cada fibra (direct, requiere --method pool)")
+    p.add_argument("--n_rep", type=int, default=8,
+                   help="scrambles independientes por fibra con --sampler sobol/halton (error estándar)")
+    p.add_argument("--bbox", action="store_true",
+                   help="muestrear cada fibra solo dentro de su caja alineada a los ejes")
+    p.add_argument("--search", choices=["random", "racing"], default="random",
+                   help="búsqueda del cp: todos los candidatos con presupuesto completo (random) "
+                        "o successive halving (racing)")
+    p.add_argument("--eta", type=float, default=2.0, help="racing: factor de descarte/aumento por ronda")
+    p.add_argument("--refine_steps", type=int, default=0,
+                   help="evaluaciones de búsqueda por patrones alrededor del mejor cp (0 = sin refinar)")
+    p.add_argument("--prune", action="store_true",
+                   help="abandonar un candidato apenas una dirección lo deja bajo el mejor F")
+    p.add_argument("--prune_margin", type=float, default=0.0,
+                   help="margen de confianza para --prune (F < bestF - margen)")
+    p.add_argument("--cp_method", choices=["fiber", "vertices", "reject"], default="fiber",
+                   help="generación de candidatos cp: uniformes en cada fibra, combinaciones convexas "
+                        "de sus vértices, o z × [0,1]^d con rechazo (esquema anterior)")
+    p.add_argument("--fiber_weights", default="volume",
+                   help="reparto de candidatos entre fibras: volume, uniform o pesos separados por coma")
+    p.add_argument("--hw", type=float, default=None,
+                   help="semiancho IC 95 %% objetivo para F: las muestras por fibra crecen desde N "
+                        "hasta alcanzarlo (requiere --method pool)")
+    p.add_argument("--N_max", type=int, default=None, help="tope de muestras por fibra con --hw")
+    p.add_argument("--min_hull", action="store_true",
+                   help="reduce (A, b): une caras coplanares y quita filas redundantes en las fibras")
+    p.add_argument("--float32", action="store_true",
+                   help="test de pertenencia en float32 (recomprueba en float64 los puntos cerca de una cara)")
+    p.add_argument("--threads", type=int, default=1,
+                   help="hilos para evaluar los candidatos cp en paralelo dentro de la réplica")
+    p.add_argument("--seed", type=int, default=None,
+                   help="entropía de la SeedSequence (por defecto, del sistema; queda guardada en el NPZ)")
+    p.add_argument("--spawn_key", nargs="*", type=int, default=[],
+                   help="spawn_key de la SeedSequence (el runner da una por réplica)")
     p.add_argument("--results_root", type=Path, default=Path("results"), help="carpeta raíz para guardar resultados")
+    p.add_argument("--store", type=Path, default=None,
+                   help="guardar en un almacén solo-agregar (result_store.py) en vez de NPZ sueltos")
+    p.add_argument("--time_budget", type=float, default=None,
+                   help="segundos para la réplica: al agotarse, ortel devuelve el mejor cp hasta ahí "
+                        "y el resultado se guarda como parcial (ruta partial)")
+    p.add_argument("--deadline", type=float, default=None,
+                   help="instante límite absoluto (time.time()), p. ej. el fin del job; con "
+                        "--time_budget manda el más cercano")
+    p.add_argument("--checkpoint", type=Path, default=None,
+                   help="JSON donde ortel guarda la búsqueda y desde donde la retoma si ya existe; "
+                        "se borra al guardar un resultado completo (requiere --seed, para que al "
+                        "relanzar se arme el mismo politopo)")
+    p.add_argument("--checkpoint_every", type=float, default=60.0,
+                   help="segundos entre checkpoints")
+    p.add_argument("--profile_log", type=Path, default=None,
+                   help="agregar los tiempos por etapa y contadores de la réplica como una línea JSON")
 
     # flags legacy (compatibilidad)
-    p.add_argument("--seed", type=int, default=None, help=argparse.SUPPRESS)
     p.add_argument("--out", type=Path, default=None, help=argparse.SUPPRESS)
     p.add_argument("--save_hull_dir", type=Path, default=None, help=argparse.SUPPRESS)
     p.add_argument("--save_hull_obs_dir", type=Path, default=None, help=argparse.SUPPRESS)
     return p
 
 
-def main():
-    args = build_parser().parse_args()
+def parse_fiber_weights(text, z_vals):
+    """
+    --fiber_weights: "volume", "uniform" o una lista de pesos separados por coma,
+    uno por fibra de z_vals y no negativos (si no, ValueError).
+    """
+    if text in ("volume", "uniform"):
+        return text
+    try:
+        w = [float(x) for x in text.split(",")]
+    except ValueError:
+        raise ValueError(f"--fiber_weights {text!r}: usa volume, uniform o pesos separados "
+                         "por coma.") from None
+    if len(w) != len(z_vals):
+        raise ValueError(f"--fiber_weights necesita {len(z_vals)} pesos (uno por valor de "
+                         f"--z_vals); se dieron {len(w)}: {text!r}.")
+    if any(x < 0 for x in w):
+        raise ValueError(f"--fiber_weights no admite pesos negativos: {text!r}.")
+    return w
+
+
+def check_args(args):
+    """ValueError si la combinación de argumentos no tiene sentido (antes de hacer nada)."""
+    if args.checkpoint is not None and args.seed is None:
+        raise ValueError("--checkpoint requiere --seed: sin ella, al relanzar se genera otro "
+                         "politopo y el checkpoint no se puede retomar.")
+    check_method(int(args.d), args.method, args.sampler)
+    if args.hw is not None and args.method == "indep":
+        raise ValueError("--hw no se puede usar con --method indep (F no tiene error estándar; "
+                         "usa --method pool).")
+    parse_fiber_weights(args.fiber_weights, args.z_vals)
+
+
+def run_experiment(args, store=None):
+    """
+    Corre una réplica completa (politopo aleatorio, búsqueda de cp y guardado de
+    los NPZ) a partir de los argumentos ya parseados (build_parser().parse_args).
 
+    Es lo que hace la línea de comandos, pero como función: run_ortel_parallel la
+    llama dentro de workers persistentes, sin lanzar un intérprete por réplica.
+    Con store (ResultStore) o --store la réplica se agrega al almacén en vez de
+    escribir result_*.npz y verts_*.npz; result_path es entonces la ruta lógica
+    del registro.
+
+    Con --time_budget / --deadline la búsqueda se corta a tiempo y la réplica
+    se guarda igual, como parcial (subdir "partial", timed_out=True); con
+    --checkpoint, correrla de nuevo con los mismos argumentos la retoma donde
+    quedó (ver ortel.ortel).
+
+    Devuelve un dict con F, bestcp, best_u, subdir ("hulls" / "hulls_obs" /
+    "partial"), result_path, verts_path, n_per_z, seed_entropy, seed_spawn_key,
+    los contadores de ortel (stats), los tiempos t_hull, t_search, t_total (s),
+    profile (profiling.snapshot de la réplica: tiempos por etapa y contadores,
+    que también se guardan en el NPZ como prof_* y, con --profile_log, como
+    una línea JSON) y timed_out.
+    """
+    check_args(args)
+    t0 = time.perf_counter()
+    deadline = args.deadline
+    if args.time_budget is not None:
+        deadline = min(time.time() + args.time_budget, deadline or np.inf)
+    profiling.reset()
     d = int(args.d)
     z_vals = [int(z) for z in args.z_vals]
     n_per_z = int(args.n_point) if args.n_point is not None else int(args.n_per_z)
@@ -46,15 +163,29 @@ def main():
     N_hip = int(args.N_hip)
     f_threshold = float(args.f_threshold)
     target_mb = args.target_mb
+    method = args.method
+    sampler = args.sampler
+    bbox = bool(args.bbox)
+    search = args.search
+    ortel_stats = {}
+    fiber_weights = parse_fiber_weights(args.fiber_weights, z_vals)
+
+    # semillas: una SeedSequence por réplica; flujos independientes para el
+    # politopo y para la búsqueda (reproducibles con --seed/--spawn_key)
+    ss = np.random.SeedSequence(args.seed, spawn_key=tuple(args.spawn_key))
+    ss_hull, ss_search = ss.spawn(2)
 
     # fecha/timestamp
     day_str = datetime.now().strftime("%Y-%m-%d")
 
     # 1) puntos por fibra
-    verts = random_vertices_by_fiber(z_vals, d, n_per_z)
+    rng_hull = np.random.default_rng(ss_hull)
+    verts = random_vertices_by_fiber(z_vals, d, n_per_z, rng=rng_hull)
 
     # 2) envolvente convexa
-    A, b = generate_convex_hull(verts)
+    A, b = generate_convex_hull(verts, rng=rng_hull, minimal=bool(args.min_hull), z_vals=z_vals)
+
+    t_hull = time.perf_counter() - t0
 
     # 3) búsqueda de centerpoint (ahora regresa también la dirección bestU)
     bestCP, bestF, bestU = ortel(
@@ -66,29 +197,58 @@ def main():
         tol=1e-9,
         batch=None,
         target_mb=target_mb,
+        method=method,
+        sampler=sampler,
+        bbox=bbox,
+        search=search,
+        eta=float(args.eta),
+        refine_steps=int(args.refine_steps),
+        prune=bool(args.prune),
+        prune_margin=float(args.prune_margin),
+        stats=ortel_stats,
+        cp_method=args.cp_method,
+        fiber_weights=fiber_weights,
+        hw=args.hw,
+        N_max=args.N_max,
+        n_rep=int(args.n_rep),
+        dtype=(np.float32 if args.float32 else np.float64),
+        rng=np.random.default_rng(ss_search),
+        threads=int(args.threads),
+        deadline=deadline,
+        checkpoint=args.checkpoint,
+        checkpoint_every=float(args.checkpoint_every),
     )
+    t_search = time.perf_counter() - t0 - t_hull
+    profile = profiling.snapshot()
 
     # 4) ruta de guardado según F
-    subdir = "hulls" if bestF >= f_threshold else "hulls_obs"
+    # (una búsqueda cortada por --time_budget va aparte: su F es solo parcial)
+    timed_out = bool(ortel_stats.get("timed_out", False))
+    if timed_out:
+        subdir = "partial"
+    else:
+        subdir = "hulls" if bestF >= f_threshold else "hulls_obs"
     day_dir = args.results_root / subdir / day_str
-    day_dir.mkdir(parents=True, exist_ok=True)
 
     # timestamp con fecha+hora+minuto+segundo
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-    # base del nombre del archivo
-    base = f"npoint_{n_per_z}_{ts}"
+    # base del nombre del archivo; el sufijo de la semilla evita choques entre
+    # réplicas que terminan en el mismo segundo
+    tag = "_".join([f"{ss.entropy % 16**8:08x}", *map(str, ss.spawn_key)])
+    base = f"npoint_{n_per_z}_{ts}_{tag}"
 
     # rutas completas dentro de la carpeta del día
     result_path = f"{day_dir}/result_{base}.npz"
     verts_path  = f"{day_dir}/verts_{base}.npz"
 
-    # 5) guardar NPZs
-    np.savez_compressed(
-        result_path,
+    # 5) guardar: NPZs sueltos o un registro en el almacén
+    result = dict(
         A=A,
         b=b,
         F=np.float64(bestF),
+        F_stderr=np.float64(ortel_stats.get("F_stderr", np.nan)),
+        N_used=np.int64(ortel_stats.get("n_samples", 0)),
         bestcp=np.asarray(bestCP, dtype=float),
         best_u=np.asarray(bestU, dtype=float),  # ← aquí guardamos la dirección u*
         d=np.int64(d),
@@ -99,13 +259,38 @@ def main():
         n_per_z=np.int64(n_per_z),
         f_threshold=np.float64(f_threshold),
         target_mb=(np.float64(target_mb) if target_mb is not None else np.float64(np.nan)),
+        method=method,
+        sampler=sampler,
+        bbox=np.bool_(bbox),
+        search=search,
+        eta=np.float64(args.eta),
+        refine_steps=np.int64(args.refine_steps),
+        prune=np.bool_(args.prune),
+        prune_margin=np.float64(args.prune_margin),
+        cp_method=args.cp_method,
+        fiber_weights=str(args.fiber_weights),
+        hw=(np.float64(args.hw) if args.hw is not None else np.float64(np.nan)),
+        N_max=np.int64(args.N_max if args.N_max is not None else N),
+        n_rep=np.int64(args.n_rep),
+        min_hull=np.bool_(args.min_hull),
+        float32=np.bool_(args.float32),
+        threads=np.int64(args.threads),
+        timed_out=np.bool_(timed_out),
+        resumed=np.bool_(ortel_stats.get("resumed", False)),
+        n_cand=np.int64(ortel_stats.get("n_cand", 0)),
+        n_cand_done=np.int64(ortel_stats.get("n_cand_done", 0)),
+        seed_entropy=str(ss.entropy),
+        seed_spawn_key=np.array(ss.spawn_key, dtype=np.int64),
+        n_dir_eval=np.int64(ortel_stats.get("n_dir", 0)),
+        n_pruned=np.int64(ortel_stats.get("n_pruned", 0)),
+        t_hull=np.float64(t_hull),
+        t_search=np.float64(t_search),
+        **profiling.to_record(profile),
         timestamp=np.int64(ts),
         saved_dir=str(day_dir),
         file_tag=base,
     )
-
-    np.savez_compressed(
-        verts_path,
+    verts_rec = dict(
         verts=verts,
         d=np.int64(d),
         z_vals=np.array(z_vals, dtype=np.int64),
@@ -115,9 +300,64 @@ def main():
         file_tag=base,
     )
 
-    print(f"[OK] F={bestF:.5f} (threshold={f_threshold}) -> {subdir}\n"
-          f"  - {result_path}\n"
-          f"  - {verts_path}")
+    if store is None and args.store is not None:
+        store = ResultStore(args.store)
+    if store is not None:
+        result_path = verts_path = store.append(
+            {**result, "verts": verts},
+            {
+                "id": base, "n_per_z": n_per_z, "route": subdir, "F": float(bestF),
+                "F_stderr": result["F_stderr"], "d": d, "seed_entropy": ss.entropy,
+                "seed_spawn_key": " ".join(map(str, ss.spawn_key)), "timestamp": ts,
+            },
+        )
+    else:
+        day_dir.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(result_path, **result)
+        np.savez_compressed(verts_path, **verts_rec)
+
+    if args.checkpoint is not None and not timed_out:
+        args.checkpoint.unlink(missing_ok=True)
+
+    if args.profile_log is not None:
+        args.profile_log.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.profile_log, "a", encoding="utf-8") as fh:
+            fh.write(profiling.to_json(profile, id=base, n_per_z=n_per_z, F=float(bestF),
+                                       t_hull=t_hull, t_search=t_search) + "\n")
+
+    return {
+        "F": float(bestF),
+        "bestcp": np.asarray(bestCP, dtype=float),
+        "best_u": np.asarray(bestU, dtype=float),
+        "n_per_z": n_per_z,
+        "subdir": subdir,
+        "result_path": result_path,
+        "verts_path": verts_path,
+        "seed_entropy": ss.entropy,
+        "seed_spawn_key": tuple(ss.spawn_key),
+        "stats": dict(ortel_stats),
+        "t_hull": t_hull,
+        "t_search": t_search,
+        "t_total": time.perf_counter() - t0,
+        "profile": profile,
+        "timed_out": timed_out,
+    }
+
+
+def main():
+    p = build_parser()
+    args = p.parse_args()
+    try:
+        check_args(args)
+    except ValueError as e:
+        p.error(str(e))
+    res = run_experiment(args)
+    print(f"[OK] F={res['F']:.5f} (threshold={args.f_threshold}) -> {res['subdir']}\n"
+          f"  - seed={res['seed_entropy']} spawn_key={' '.join(map(str, res['seed_spawn_key']))}\n"
+          f"  - {res['result_path']}\n"
+          f"  - {res['verts_path']}")
+    print("[PROF] " + profiling.to_json(res["profile"], t_hull=res["t_hull"],
+                                        t_search=res["t_search"]))
     return 0
 
 
@@ -1,17 +1,32 @@
 # ortel.py
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import numpy as np
 from numpy.linalg import norm  # por si lo usas en otros lugares
 from typing import List, Tuple, Optional
 
+import profiling
 from vol_reject import rejection_sampling  # si ya no lo usas, lo puedes borrar
-from vol_star import ratio_cp
+from fibers import fiber_vertices
+from samplers import make_rng
+from vol_star import FiberGeometry, check_method, ratio_cp
 
 
 def _inside(A: np.ndarray, b: np.ndarray, x: np.ndarray, tol: float = 1e-9) -> bool:
-    """Chequea si x cumple Ax <= b (con tolerancia)."""
-    return bool(np.all(A @ x <= b + tol))
+    """Chequea si x cumple Ax <= b (con tolerancia); los rechazos van a profiling "cp_rejected"."""
+    ok = bool(np.all(A @ x <= b + tol))
+    if not ok:
+        profiling.count("cp_rejected")
+    return ok
 
 
+@profiling.timed("ortel")
 def ortel(
     A: np.ndarray,
     b: np.ndarray,
@@ -23,11 +38,74 @@ def ortel(
     tol: float = 1e-9,
     batch: Optional[int] = None,
     target_mb=None,
+    method: str = "indep",  # "indep" | "pool" | "exact" | "sweep" (ver vol_star.ratio_cp)
+    sampler: str = "mc",    # "mc" | "sobol" | "halton" | "direct" (ver vol_star.ratio_cp)
+    bbox: bool = False,     # muestrear cada fibra solo en su caja alineada a los ejes
+    search: str = "random",  # "random" | "racing" (successive halving sobre los candidatos)
+    eta: float = 2.0,        # racing: se conserva 1/eta de los candidatos por ronda
+    refine_steps: int = 0,   # evaluaciones de búsqueda por patrones al final (0 = sin refinar)
+    prune: bool = False,     # cortar ratio_cp apenas F(cp) < bestF - prune_margin
+    prune_margin: float = 0.0,
+    stats: Optional[dict] = None,
+    cp_method: str = "fiber",  # "fiber" | "vertices" | "reject" (ver _cp_candidates)
+    fiber_weights="volume",    # "volume" | "uniform" | secuencia de pesos por fibra
+    hw: Optional[float] = None,    # semiancho IC 95 % objetivo para F (method="pool")
+    N_max: Optional[int] = None,   # tope de muestras por fibra al crecer secuencialmente
+    n_rep: int = 8,                # scrambles independientes por fibra con sampler QMC
+    dtype=np.float64,              # precisión del test de pertenencia (float32: ver MembershipKernel)
+    rng=None,                      # numpy.random.Generator, semilla o None (ver samplers.make_rng)
+    threads: int = 1,              # hilos para evaluar candidatos en paralelo
+    deadline: Optional[float] = None,  # time.time() límite: se devuelve lo mejor hasta ahí
+    checkpoint=None,                   # ruta JSON para guardar y retomar la búsqueda
+    checkpoint_every: float = 60.0,    # segundos entre checkpoints
 ) -> Tuple[np.ndarray, float, np.ndarray]:
     """
     Busca un centerpoint aproximado maximizando:
         F(cp) = min_u  [ sum_z min(Vol(S_z ∩ H_u^+), Vol(S_z ∩ H_u^-)) ] / sum_z Vol(S_z)
 
+    search="random" evalúa los N_cp candidatos con el presupuesto completo
+    (N_hip direcciones, N muestras). search="racing" los evalúa primero con un
+    presupuesto reducido, descarta la peor fracción y multiplica el presupuesto
+    de los sobrevivientes por eta en cada ronda; la última ronda usa N_hip y N.
+    Con refine_steps > 0 se hace al final una búsqueda por patrones alrededor del
+    mejor cp, dentro de su fibra.
+
+    Los candidatos se generan dentro de la envolvente (cp_method="fiber": uniformes
+    en cada S_z; "vertices": combinaciones convexas aleatorias de sus vértices),
+    repartidos entre fibras según fiber_weights. cp_method="reject" es el esquema
+    anterior: z × U([0,1]^d) descartando los que caen fuera.
+
+    Con prune=True, cada ratio_cp recibe el mejor F hasta el momento como cota y
+    abandona el candidato en cuanto una dirección lo deja por debajo (búsqueda
+    random y refinamiento; racing necesita los valores completos para ordenar).
+    Con hw y N_max, las muestras por fibra crecen (compartidas por todos los
+    candidatos) hasta que F(cp) tenga la precisión pedida; ver FiberGeometry.
+    Con sampler "sobol" o "halton", las muestras de cada fibra se reparten en
+    n_rep scrambles independientes, de cuya dispersión sale el error estándar.
+    Con dtype=np.float32 el test de pertenencia de los métodos Monte Carlo se
+    hace en float32, recomprobando en float64 los puntos cerca de una cara.
+
+    Toda la aleatoriedad (candidatos, muestras, direcciones) sale de rng: con
+    la misma semilla la búsqueda se repite bit a bit.
+
+    Con threads > 1 los candidatos de cada ronda se evalúan en un pool de hilos
+    (NumPy suelta el GIL en los productos y reducciones). Las muestras por fibra
+    se construyen antes (FiberGeometry.prepare) y cada candidato usa su propio
+    flujo rng.spawn, así que el resultado no depende de threads (salvo con
+    prune o hw, donde el orden de evaluación cambia qué se poda o cuándo
+    crecen los pools).
+
+    Con deadline (time.time()) se devuelve el mejor cp hallado hasta ese instante.
+    Con checkpoint (ruta JSON) la búsqueda se guarda cada checkpoint_every
+    segundos y se retoma si el archivo ya existe (ver _load_checkpoint).
+
+    Si se entrega stats (dict), se llenan stats["n_eval"] (evaluaciones de F),
+    stats["n_dir"] (direcciones evaluadas en total), stats["n_pruned"], y para
+    el mejor cp stats["F_stderr"] y stats["n_samples"] (muestras por fibra),
+    además de stats["timed_out"], stats["resumed"] (si se retomó de un
+    checkpoint), stats["n_cand"] y stats["n_cand_done"] (candidatos generados
+    y evaluados en la búsqueda random).
+
     Retorna
     -------
     bestCP : np.ndarray (1+d,), el mejor cp encontrado
@@ -47,44 +125,181 @@ def ortel(
         raise ValueError(
             f"Dimensiones incompatibles: A {A.shape}, b {b.shape}, d={d} (esperado A.shape[1] = 1+d)."
         )
+    if search not in ("random", "racing"):
+        raise ValueError(f"search desconocido: {search!r} (usa 'random' o 'racing').")
+    if cp_method not in ("fiber", "vertices", "reject"):
+        raise ValueError(
+            f"cp_method desconocido: {cp_method!r} (usa 'fiber', 'vertices' o 'reject')."
+        )
+    check_method(d, method, sampler)
+    if hw is not None and method == "indep":
+        raise ValueError("hw no se puede usar con method='indep': cada dirección usa muestras "
+                         "nuevas y F no tiene error estándar (usa method='pool').")
+
+    rng = make_rng(rng)
+    ck = None
+    if checkpoint is not None:
+        checkpoint = Path(checkpoint)
+        ck_key = _checkpoint_key(A, b, d, z_vals, N_cp=int(N_cp), N_hip=int(N_hip), N=int(N),
+                                 method=method, sampler=sampler, bbox=bool(bbox), search=search,
+                                 eta=float(eta), refine_steps=int(refine_steps),
+                                 cp_method=cp_method, fiber_weights=fiber_weights, hw=hw,
+                                 N_max=N_max, n_rep=int(n_rep), dtype=np.dtype(dtype).name)
+        ck = _load_checkpoint(checkpoint, ck_key)
+        if ck is not None:
+            rng = _rng_restore(ck["rng"])
+        rng_start = _rng_snapshot(rng)
+
+    if stats is None:
+        stats = {}
+    stats.update(n_eval=0, n_dir=0, n_pruned=0, F_stderr=np.nan, n_samples=0,
+                 timed_out=False, resumed=ck is not None, n_cand=0, n_cand_done=0)
+    if ck is not None:
+        stats.update(ck["stats"])
+    last = {}  # cp -> (stderr, n_samples) de su última evaluación
+    threads = max(1, int(threads))
+    lock = threading.Lock()
+    best = {"F": -np.inf}  # mejor F visto, cota de poda compartida entre hilos
+
+    def _expired():
+        return deadline is not None and time.time() >= deadline
+
+    def _save(phase, n_done, cands, rng_refine=None, refine=None):
+        state = {
+            "key": ck_key, "rng": rng_start, "phase": phase, "next": int(n_done),
+            "cands": [np.asarray(c, float).tolist() for c in cands],
+            "best": None, "rng_refine": rng_refine, "refine": refine,
+            "stats": {k: stats[k] for k in ("n_eval", "n_dir", "n_pruned")},
+        }
+        if bestCP is not None:
+            state["best"] = {"cp": np.asarray(bestCP, float).tolist(), "F": float(bestF),
+                             "u": np.asarray(bestU, float).tolist(),
+                             "last": [float(v) for v in last.get(tuple(bestCP), (np.nan, 0))]}
+        _write_checkpoint(checkpoint, state)
+
+    def _score(cp, n_hip, g, incumbent=None, rng_cp=None):
+        # racing evalúa sin cota (incumbent=None) aunque prune=True, y antes del
+        # primer candidato la cota es -inf: en ambos casos no se poda
+        if not prune or incumbent is None or not np.isfinite(incumbent):
+            incumbent = None
+        info = {}
+        out = ratio_cp(
+            A, b, cp, z_vals, n_hip, d, g.N,
+            tol=tol, batch=batch, target_mb=target_mb, method=method,
+            sampler=sampler, geom=g, incumbent=incumbent,
+            margin=prune_margin, stats=info, rng=rng_cp,
+        )
+        with lock:
+            stats["n_eval"] += 1
+            stats["n_dir"] += info["n_dir"]
+            stats["n_pruned"] += int(info["pruned"])
+            profiling.count("cp_pruned", int(info["pruned"]))
+            last[tuple(cp)] = (info["stderr"], info["n_samples"])
+        return out
+
+    def _score_all(cps, n_hip, g, live_prune=False):
+        """
+        [(F, u)] de cada cp, en orden, con un flujo rng.spawn por candidato.
+        Con live_prune, cada evaluación usa como cota el mejor F visto hasta ese
+        momento (el orden de la lista si threads = 1).
+        """
+        with profiling.stage("ortel.prepare"):
+            g.prepare(method)
+        rngs = rng.spawn(len(cps))
+
+        def _one(i):
+            F_cp, u_cp = _score(cps[i], n_hip, g, incumbent=(best["F"] if live_prune else None),
+                                rng_cp=rngs[i])
+            with lock:
+                best["F"] = max(best["F"], float(F_cp))
+            return F_cp, u_cp
+
+        if threads > 1 and len(cps) > 1:
+            with ThreadPoolExecutor(max_workers=threads) as ex:
+                return list(ex.map(_one, range(len(cps))))
+        return [_one(i) for i in range(len(cps))]
+
+    # Volúmenes, muestras y polígonos por fibra: no dependen de cp, se comparten
+    geom = FiberGeometry(A, b, d, z_vals, N, tol=tol, batch=batch, target_mb=target_mb,
+                         sampler=sampler, bbox=bbox, hw=hw, N_max=N_max, n_rep=n_rep, dtype=dtype,
+                         rng=rng)
 
     # -------- búsqueda de CP --------
     bestF: float = -np.inf
     bestCP: Optional[np.ndarray] = None
     bestU: Optional[np.ndarray] = None
 
-    for _ in range(int(N_cp)):
-        # Muestreamos un cp candidato en z × [0,1]^d:
-        z_cp = int(np.random.choice(z_vals_arr))
-        p_cp = np.random.rand(d)                 # (d,)
-        cp = np.concatenate([[float(z_cp)], p_cp]).astype(float)
+    # Candidatos dentro de la envolvente
+    with profiling.stage("ortel.candidates"):
+        cands = _cp_candidates(A, b, d, z_vals, int(N_cp), geom, cp_method=cp_method,
+                               fiber_weights=fiber_weights, tol=tol, rng=rng)
+    profiling.count("cp_candidates", len(cands))
+    stats["n_cand"] = len(cands)
 
-        # Debe caer dentro de la envolvente
-        if not _inside(A, b, cp, tol=tol):
-            continue
+    phase = "random"
+    if ck is not None:
+        if len(ck["cands"]) != len(cands) or not np.array_equal(np.asarray(ck["cands"], float),
+                                                                  np.asarray(cands, float)):
+            raise ValueError(f"{checkpoint}: los candidatos no coinciden con los del checkpoint.")
+        phase = ck["phase"]
+        if ck["best"] is not None:
+            bestCP = np.asarray(ck["best"]["cp"], dtype=float)
+            bestF = float(ck["best"]["F"])
+            bestU = np.asarray(ck["best"]["u"], dtype=float)
+            best["F"] = bestF
+            last[tuple(bestCP)] = (ck["best"]["last"][0], int(ck["best"]["last"][1]))
 
-        # Evalúa F(cp) con N_hip direcciones y N muestras por fibra
-        F_cp, u_cp = ratio_cp(
-            A, b, cp, z_vals, N_hip, d, N,
-            tol=tol, batch=batch, target_mb=target_mb
+    if phase == "done":
+        stats["n_cand_done"] = int(ck["next"])
+    elif search == "racing" and cands:
+        bestCP, bestF, bestU = _racing(
+            cands, _score_all, A, b, d, z_vals, N_hip, N, eta=eta, geom_full=geom,
+            tol=tol, batch=batch, target_mb=target_mb, sampler=sampler, bbox=bbox, n_rep=n_rep,
+            dtype=dtype, rng=rng, deadline=deadline, stats=stats,
         )
+    elif phase == "random":
+        # Evalúa F(cp) con N_hip direcciones y N muestras por fibra; con deadline o
+        # checkpoint, de a `threads` candidatos para poder cortar y guardar entre medio
+        i = 0
+        if ck is not None:
+            i = int(ck["next"])
+            rng.spawn(i)  # flujos de los candidatos ya evaluados: los demás quedan igual
+        step = len(cands) if deadline is None and checkpoint is None else threads
+        t_ck = time.monotonic()
+        while i < len(cands):
+            if i > 0 and _expired():
+                stats["timed_out"] = True
+                break
+            chunk = cands[i:i + step]
+            for cp, (F_cp, u_cp) in zip(chunk, _score_all(chunk, N_hip, geom, live_prune=True)):
+                if F_cp > bestF:
+                    bestF = float(F_cp)
+                    bestCP = cp.copy()
+                    bestU = np.asarray(u_cp, dtype=float)
+            i += len(chunk)
+            if checkpoint is not None and time.monotonic() - t_ck >= checkpoint_every:
+                _save("random", i, cands)
+                t_ck = time.monotonic()
+        stats["n_cand_done"] = i
+    else:
+        # se retoma en el refinamiento: mismas muestras y mismo rng que sin corte
+        stats["n_cand_done"] = int(ck["next"])
+        geom.prepare(method)
+        rng.bit_generator.state = ck["rng_refine"]
+        if ck["refine"] is not None:
+            bestCP = np.asarray(ck["refine"]["cp"], dtype=float)
+            bestF = float(ck["refine"]["F"])
+            bestU = np.asarray(ck["refine"]["u"], dtype=float)
+            last[tuple(bestCP)] = (ck["refine"]["last"][0], int(ck["refine"]["last"][1]))
 
-        if F_cp > bestF:
-            bestF = float(F_cp)
-            bestCP = cp.copy()
-            bestU = np.asarray(u_cp, dtype=float)
-
-    # Fallback: intenta encontrar un cp válido si no hubo suerte
-    if bestCP is None:
+    # Fallback (solo cp_method="reject"): intenta encontrar un cp válido si no hubo suerte
+    if bestCP is None and cp_method == "reject":
         for _ in range(1000):
-            z_cp = int(np.random.choice(z_vals_arr))
-            p_cp = np.random.rand(d)
+            z_cp = int(rng.choice(z_vals_arr))
+            p_cp = rng.random(d)
             cp_try = np.concatenate([[float(z_cp)], p_cp])
             if _inside(A, b, cp_try, tol=tol):
-                F_cp, u_cp = ratio_cp(
-                    A, b, cp_try, z_vals, N_hip, d, N,
-                    tol=tol, batch=batch, target_mb=target_mb
-                )
+                F_cp, u_cp = _score(cp_try, N_hip, geom)
                 bestCP = cp_try.astype(float)
                 bestF = float(F_cp)
                 bestU = np.asarray(u_cp, dtype=float)
@@ -96,7 +311,305 @@ def ortel(
         bestF = float(0.0)
         bestU = np.zeros(d, dtype=float)
 
+    elif int(refine_steps) > 0 and phase != "done" and not stats["timed_out"]:
+        t_ck = time.monotonic()
+
+        def _on_eval(st, final):
+            # posición del refinamiento y estado de rng en ese punto
+            nonlocal t_ck
+            if checkpoint is not None and (final or time.monotonic() - t_ck >= checkpoint_every):
+                st["last"] = [float(v) for v in last.get(tuple(st["cp"]), (np.nan, 0))]
+                _save("refine", stats["n_cand_done"], cands,
+                      rng_refine=rng.bit_generator.state, refine=st)
+                t_ck = time.monotonic()
+
+        if checkpoint is not None and phase == "random":
+            _save("refine", stats["n_cand_done"], cands, rng_refine=rng.bit_generator.state)
+        with profiling.stage("ortel.refine"):
+            bestCP, bestF, bestU = _pattern_search(
+                bestCP, float(bestF), bestU, lambda cp, F_inc: _score(cp, N_hip, geom, F_inc),
+                A, b, int(refine_steps), tol=tol, deadline=deadline, stats=stats,
+                state=(ck["refine"] if phase == "refine" else None), on_eval=_on_eval,
+            )
+
     if bestU is None:
         bestU = np.zeros(d, dtype=float)
 
+    stats["F_stderr"], stats["n_samples"] = last.get(tuple(bestCP), (np.nan, 0))
+
+    if checkpoint is not None and phase != "done":
+        if not stats["timed_out"]:
+            _save("done", stats["n_cand_done"], cands)
+        elif phase == "random" and stats["n_cand_done"] < len(cands):
+            _save("random", stats["n_cand_done"], cands)
+        # cortado en el refinamiento: _on_eval ya guardó la posición
+
     return bestCP, float(bestF), bestU
+
+
+def _checkpoint_key(A, b, d, z_vals, **params):
+    """Huella de un problema de búsqueda: el checkpoint solo sirve para el mismo."""
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(A, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(b, dtype=np.float64).tobytes())
+    return {"Ab_sha1": h.hexdigest(), "d": int(d), "z_vals": [int(z) for z in z_vals],
+            **json.loads(json.dumps(params))}
+
+
+def _rng_snapshot(rng):
+    """Estado JSON de un Generator (bit generator y su SeedSequence) para _rng_restore."""
+    bg = rng.bit_generator
+    ss = bg.seed_seq
+    if not isinstance(ss, np.random.SeedSequence):
+        raise ValueError("checkpoint requiere un rng creado desde una SeedSequence.")
+    return {"bit_generator": type(bg).__name__, "state": bg.state, "entropy": ss.entropy,
+            "spawn_key": list(ss.spawn_key), "n_children_spawned": ss.n_children_spawned}
+
+
+def _rng_restore(snap):
+    """Generator con el estado guardado por _rng_snapshot (incluye los spawn ya hechos)."""
+    ss = np.random.SeedSequence(snap["entropy"], spawn_key=tuple(snap["spawn_key"]),
+                                n_children_spawned=snap["n_children_spawned"])
+    bg = getattr(np.random, snap["bit_generator"])(ss)
+    bg.state = snap["state"]
+    return np.random.Generator(bg)
+
+
+def _load_checkpoint(path, key):
+    """
+    Checkpoint de path (None si no existe); ValueError si es de otro problema.
+
+    Al retomar, ortel restaura rng, regenera los mismos candidatos y muestras
+    y salta los ya evaluados (o sigue el refinamiento en el mismo paso), así
+    que el resultado es el mismo que sin corte (salvo con hw, o con prune y
+    threads > 1). Con phase="done" devuelve el resultado guardado sin buscar;
+    borrar el archivo es cosa del llamador.
+    """
+    if not path.exists():
+        return None
+    ck = json.loads(path.read_text(encoding="utf-8"))
+    if ck.get("key") != key:
+        diff = sorted(k for k in set(ck.get("key", {})) | set(key)
+                      if ck.get("key", {}).get(k) != key.get(k))
+        raise ValueError(f"{path} es de otra búsqueda ({', '.join(diff)}); bórralo o usa otra ruta.")
+    return ck
+
+
+def _write_checkpoint(path, state):
+    """
+    Escritura atómica: un corte a mitad deja el checkpoint anterior intacto.
+
+    state (JSON): "key" (_checkpoint_key), "rng" (estado inicial, _rng_snapshot),
+    "phase" ("random", "refine" o "done"), "next" (candidatos ya evaluados),
+    "cands", "best" ({"cp", "F", "u", "last"} o None), "rng_refine" y "refine"
+    (posición de _pattern_search) y "stats" (contadores). Con search="racing"
+    solo se guarda el resultado final.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def _cp_candidates(A, b, d, z_vals, n, geom, cp_method="fiber", fiber_weights="volume",
+                   tol=1e-9, rng=None):
+    """
+    Lista de hasta n candidatos cp = (z, p) dentro de la envolvente.
+
+    cp_method
+        "fiber"    : p uniforme en S_z (triangulación de la fibra, geom.triangulation).
+        "vertices" : p = combinación convexa de los vértices de S_z con pesos
+                     Dirichlet(1, ..., 1); no es uniforme, pero cubre la fibra.
+        "reject"   : z uniforme, p ~ U([0,1]^d), se descartan los que caen fuera
+                     (puede devolver menos de n candidatos).
+    fiber_weights
+        Reparto de los n candidatos entre fibras: "volume" (∝ Vol(S_z)),
+        "uniform" (igual entre fibras no vacías) o una secuencia de pesos.
+        Las fibras vacías nunca reciben candidatos.
+
+    Con "fiber" / "vertices", una fibra cuyos vértices o triangulación no se
+    pudieron calcular (Qhull, ver fibers.fiber_vertices) se trata como en
+    "reject": sus candidatos se muestrean por rechazo en su caja (_reject_in_fiber)
+    y su peso por volumen sale de geom.vol.
+    """
+    rng = make_rng(rng)
+    if cp_method == "reject":
+        z_vals_arr = np.array(z_vals, dtype=int)
+        cands = []
+        for _ in range(n):
+            z_cp = int(rng.choice(z_vals_arr))
+            p_cp = rng.random(d)
+            cp = np.concatenate([[float(z_cp)], p_cp]).astype(float)
+            if _inside(A, b, cp, tol=tol):
+                cands.append(cp)
+        return cands
+
+    tris = [geom.triangulation(z) for z in z_vals]
+    verts = [fiber_vertices(A, b, z, d, tol=tol) if cp_method == "vertices" else None
+             for z in z_vals]
+    ok = [t.valid if cp_method == "fiber" else V is not None for t, V in zip(tris, verts)]
+    vols = np.array([t.volume if t.valid else geom.vol(z)
+                     for z, t in zip(z_vals, tris)], dtype=float)
+    if isinstance(fiber_weights, str):
+        if fiber_weights == "volume":
+            w = vols.copy()
+        elif fiber_weights == "uniform":
+            w = np.ones_like(vols)
+        else:
+            raise ValueError(
+                f"fiber_weights desconocido: {fiber_weights!r} (usa 'volume', 'uniform' o pesos)."
+            )
+    else:
+        w = np.asarray(fiber_weights, dtype=float)
+        if w.shape != vols.shape or np.any(w < 0):
+            raise ValueError(f"fiber_weights debe tener {len(z_vals)} pesos no negativos.")
+    w = np.where(vols > 0, w, 0.0)
+    if n <= 0 or w.sum() <= 0:
+        return []
+
+    counts = rng.multinomial(n, w / w.sum())
+    cands = []
+    for z, tri, V, good, k in zip(z_vals, tris, verts, ok, counts):
+        if k == 0:
+            continue
+        if not good:
+            profiling.count("cp_reject_fallback")
+            P = _reject_in_fiber(geom, z, k, rng)
+        elif cp_method == "fiber":
+            P = tri.sample(k, rng=rng)
+        else:
+            W = rng.dirichlet(np.ones(V.shape[0]), size=k)
+            P = W @ V
+        for p in P:
+            cands.append(np.concatenate([[float(z)], p]))
+    return cands
+
+
+def _reject_in_fiber(geom, z, k, rng):
+    """
+    Hasta k puntos uniformes en S_z por rechazo dentro de su caja (geom.box):
+    se muestrea por lotes hasta tener k o haber generado max(geom.N, k) puntos.
+    """
+    kern = geom.kernel(z)
+    out, n_in, gen = [], 0, 0
+    while n_in < k and gen < max(geom.N, k):
+        p, inside = kern.sample(kern.batch, rng=rng)
+        out.append(p[inside].astype(float))
+        n_in += out[-1].shape[0]
+        gen += kern.batch
+    return np.vstack(out)[:k] if out else np.empty((0, geom.d), dtype=float)
+
+
+def _racing(cands, score_all, A, b, d, z_vals, N_hip, N, eta=2.0, geom_full=None,
+            tol=1e-9, batch=None, target_mb=None, sampler="mc", bbox=False, n_rep=8,
+            dtype=np.float64, rng=None, deadline=None, stats=None):
+    """
+    Successive halving: con R = ceil(log_eta(n)) rondas, la ronda r evalúa a los sobrevivientes con
+    N_hip / eta^(R-1-r) direcciones y N / eta^(R-1-r) muestras por fibra (con
+    pisos de 16 direcciones y 1000 muestras) y conserva los ceil(n / eta) mejores.
+    La última ronda usa el presupuesto completo (geom_full). score_all(cps, n_hip, g)
+    devuelve [(F, u)] de cada candidato de la ronda.
+
+    Con deadline (time.time()), no se empiezan rondas nuevas después de ese
+    instante: se devuelve el mejor de la última ronda completa y se marca
+    stats["timed_out"].
+
+    Devuelve (bestCP, bestF, bestU) de la última ronda.
+    """
+    eta = float(eta)
+    if eta <= 1.0:
+        raise ValueError(f"eta debe ser > 1 (eta={eta}).")
+
+    n = len(cands)
+    R = max(1, int(np.ceil(np.log(n) / np.log(eta)))) if n > 1 else 1
+
+    alive = list(cands)
+    for r in range(R):
+        if r > 0 and deadline is not None and time.time() >= deadline:
+            if stats is not None:
+                stats["timed_out"] = True
+            break
+        factor = eta ** (R - 1 - r)
+        n_hip_r = max(16, int(N_hip / factor))
+        N_r = max(1000, int(N / factor))
+        if r == R - 1 and geom_full is not None:
+            g = geom_full
+        else:
+            g = FiberGeometry(A, b, d, z_vals, min(N_r, N), tol=tol, batch=batch,
+                              target_mb=target_mb, sampler=sampler, bbox=bbox, n_rep=n_rep,
+                              dtype=dtype, rng=rng)
+
+        scored = [
+            (float(F_cp), cp, np.asarray(u_cp, dtype=float))
+            for cp, (F_cp, u_cp) in zip(alive, score_all(alive, min(n_hip_r, N_hip), g))
+        ]
+        scored.sort(key=lambda t: t[0], reverse=True)
+
+        if r < R - 1:
+            keep = max(1, int(np.ceil(len(scored) / eta)))
+            alive = [cp for _, cp, _ in scored[:keep]]
+
+    F_best, cp_best, u_best = scored[0]
+    return cp_best.copy(), F_best, u_best
+
+
+def _pattern_search(cp, F, u, score, A, b, n_steps, step=0.1, min_step=1e-3, tol=1e-9,
+                    deadline=None, stats=None, state=None, on_eval=None):
+    """
+    Búsqueda por patrones (compass search) sobre las coords continuas de cp, con z
+    fijo: prueba cp ± step·e_j dentro de la envolvente, acepta la primera mejora y
+    reduce el paso a la mitad cuando ninguna mejora. Usa a lo más n_steps
+    evaluaciones de score(cp, F_actual) -> (F, u).
+
+    Con deadline (time.time()) no se hacen más evaluaciones después de ese
+    instante, salvo la primera de cada llamada (marca stats["timed_out"]).
+    on_eval(st, final) se llama después de cada evaluación y al cortar
+    (final=True) con st = {"cp", "F", "u", "step", "evals", "k"}, la posición
+    de la búsqueda (k: próximo intento ±e_j de la iteración); pasando ese st
+    como state se retoma exactamente ahí.
+    """
+    cp = np.asarray(cp, dtype=float).copy()
+    d = cp.shape[0] - 1
+    evals, k = 0, 0
+    if state is not None:
+        step, evals, k = float(state["step"]), int(state["evals"]), int(state["k"])
+
+    def _state():
+        return {"cp": cp.tolist(), "F": float(F), "u": np.asarray(u, float).tolist(),
+                "step": step, "evals": evals, "k": k}
+
+    n_here = 0
+    while evals < n_steps and step >= min_step:
+        improved = False
+        while k < 2 * d and evals < n_steps:
+            j, sign = k // 2, (1.0, -1.0)[k % 2]
+            trial = cp.copy()
+            trial[1 + j] += sign * step
+            if not (0.0 <= trial[1 + j] <= 1.0) or not _inside(A, b, trial, tol=tol):
+                k += 1
+                continue
+            if n_here > 0 and deadline is not None and time.time() >= deadline:
+                if stats is not None:
+                    stats["timed_out"] = True
+                if on_eval is not None:
+                    on_eval(_state(), True)
+                return cp, F, u
+            F_t, u_t = score(trial, F)
+            evals += 1
+            n_here += 1
+            k += 1
+            if F_t > F:
+                cp, F, u = trial, float(F_t), np.asarray(u_t, dtype=float)
+                improved = True
+                k = 0
+            if on_eval is not None:
+                on_eval(_state(), False)
+            if improved:
+                break
+        if not improved:
+            step *= 0.5
+        k = 0
+    return cp, F, u
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# ortel_batch.py
+"""
+Motor por lotes para muchos politopos chicos (n_per_z chico, pocas fibras,
+decenas de caras): en vez de un ortel() por politopo, K politopos se evalúan
+juntos en operaciones apiladas.
+
+    pad_polytopes   (A, b) de distinto #ineq → tensores (K, m_max, 1+d), (K, m_max);
+                    las filas de relleno son 0·x <= 1 y no cortan nada.
+    ortel_batch     un (bestCP, bestF, bestU) por politopo, con el estimador
+                    "pool" de ratio_cp.
+
+Todos los politopos comparten la misma muestra P ~ U([0,1]^d) (N puntos) y las
+mismas N_hip direcciones (números aleatorios comunes): la pertenencia es un
+único producto (K, m_max, d) @ (d, n) por lote de puntos, y los volúmenes de
+las fibras son conteos sobre la misma muestra.
+
+Los candidatos cp de cada politopo son puntos de su pool elegidos al azar, así
+que son uniformes en la unión de las fibras (∝ volumen, como cp_method="fiber"
+con fiber_weights="volume"). Como cp también está en P, el lado de cada punto
+respecto del hiperplano por cp con normal u sale de comparar rangos en el orden
+de P·u, que es común a todos los politopos: por bloque de direcciones se ordena
+P·u una vez, se acumulan los puntos de cada (politopo, fibra) en ese orden y
+el conteo de un candidato es una lectura en su rango. El costo es
+O(K · |z| · N · N_hip), independiente de N_cp (ratio_cp "pool" cuesta
+O(N_cp · |z| · N · N_hip) por politopo).
+
+Por ser comunes, los errores Monte Carlo de los K politopos están
+correlacionados. No hay poda, racing ni refinamiento.
+
+Como script, genera K politopos con las mismas semillas que run_experiment
+(SeedSequence(seed, spawn_key=(n_per_z, r)), flujo del politopo), los evalúa
+y guarda un NPZ con todos los resultados.
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+import profiling
+from samplers import make_rng, make_sampler
+from vol_star import _random_directions
+
+
+def pad_polytopes(As, bs):
+    """
+    Apila K descripciones (A_k, b_k), A_k de (m_k, 1+d), en tensores con relleno.
+
+    Devuelve (A, b, n_ineq): A (K, m_max, 1+d), b (K, m_max) y n_ineq (K,).
+    """
+    As = [np.asarray(A, float) for A in As]
+    bs = [np.asarray(b, float) for b in bs]
+    if not As:
+        raise ValueError("pad_polytopes necesita al menos un politopo.")
+    cols = {A.shape[1] for A in As}
+    if len(cols) != 1:
+        raise ValueError(f"los politopos tienen distinto número de columnas: {sorted(cols)}.")
+    n_ineq = np.array([A.shape[0] for A in As], dtype=np.int64)
+    K, m_max, D = len(As), int(n_ineq.max()), cols.pop()
+
+    A = np.zeros((K, m_max, D))
+    b = np.ones((K, m_max))
+    for k, (Ak, bk) in enumerate(zip(As, bs)):
+        if bk.shape != (Ak.shape[0],):
+            raise ValueError(f"politopo {k}: A {Ak.shape} y b {bk.shape} no coinciden.")
+        A[k, :Ak.shape[0]] = Ak
+        b[k, :Ak.shape[0]] = bk
+    return A, b, n_ineq
+
+
+def _inside_batch(Ap, rhs, P, target_mb=None):
+    """
+    inside (K, |z|, n): P[i] ∈ S_z del politopo k, con Ap (K, m, d) y
+    rhs (K, |z|, m) = b - a0·z + tol. Los puntos se procesan en lotes para que
+    Ap·p y las comparaciones respeten target_mb.
+    """
+    K, m, _ = Ap.shape
+    nz = rhs.shape[1]
+    n = P.shape[0]
+    out = np.empty((K, nz, n), dtype=bool)
+    per_point = K * m * (8 + nz)
+    step = max(1, int((64 if target_mb is None else target_mb) * 2**20) // per_point)
+    for s in range(0, n, step):
+        e = min(n, s + step)
+        lhs = np.matmul(Ap, P[s:e].T)                          # (K, m, nb)
+        mask = lhs[:, None, :, :] <= rhs[:, :, :, None]       # (K, |z|, m, nb)
+        np.logical_and.reduce(mask, axis=2, out=out[:, :, s:e])
+    return out
+
+
+def _pick_candidates(inside, n_cp, rng):
+    """
+    Hasta n_cp puntos aceptados por politopo, al azar y sin repetir.
+
+    Devuelve (zi, pi, valid), cada uno (K, C): índice de fibra, índice en P y
+    si el candidato existe (politopos con menos de C puntos aceptados).
+    """
+    K, nz, n = inside.shape
+    C = max(1, min(int(n_cp), nz * n))
+    keys = rng.random((K, nz * n))
+    keys[~inside.reshape(K, -1)] = -1.0
+    idx = np.argpartition(-keys, C - 1, axis=1)[:, :C]
+    valid = np.take_along_axis(keys, idx, axis=1) >= 0.0
+    return idx // n, idx % n, valid
+
+
+def _score_batch(inside, P, pi, valid, U, target_mb=None):
+    """
+    F de cada candidato: min sobre las columnas de U (d, J) de
+    sum_z min(#lado+, #lado-) / sum_z #aceptados, con los conteos sobre P.
+
+    Devuelve (F, jbest), ambos (K, C); F = -inf en candidatos no válidos.
+    """
+    K, nz, n = inside.shape
+    C = pi.shape[1]
+    J = U.shape[1]
+    n_in = inside.sum(axis=2)                                   # (K, |z|)
+    tot = np.maximum(n_in.sum(axis=1), 1).astype(float)         # (K,)
+
+    F = np.full((K, C), np.inf)
+    jbest = np.zeros((K, C), dtype=np.int64)
+    per_dir = K * nz * (n + 1) * 5 + n * 24
+    cols = max(1, min(J, int((64 if target_mb is None else target_mb) * 2**20) // per_dir))
+    ar = np.arange(n)[:, None]
+
+    for j0 in range(0, J, cols):
+        Uj = U[:, j0:j0 + cols]
+        jb = Uj.shape[1]
+        order = np.argsort(P @ Uj, axis=0)                      # (n, jb), común a todos
+        rank = np.empty_like(order)
+        np.put_along_axis(rank, order, np.broadcast_to(ar, order.shape), axis=0)
+
+        # puntos de cada (politopo, fibra) antes de cada rango: lado "-" de un cp
+        cum = np.zeros((K, nz, n + 1, jb), dtype=np.int32)
+        np.cumsum(inside[:, :, order], axis=2, out=cum[:, :, 1:])
+        r = rank[pi]                                            # (K, C, jb)
+        neg = np.take_along_axis(cum, r[:, None], axis=2)       # (K, |z|, C, jb)
+        pos = n_in[:, :, None, None] - neg
+        ratio = np.minimum(pos, neg).sum(axis=1) / tot[:, None, None]   # (K, C, jb)
+
+        jmin = ratio.argmin(axis=2)
+        rmin = np.take_along_axis(ratio, jmin[..., None], axis=2)[..., 0]
+        upd = rmin < F
+        F = np.where(upd, rmin, F)
+        jbest = np.where(upd, j0 + jmin, jbest)
+
+    F = np.where(n_in.sum(axis=1)[:, None] > 0, F, 0.0)
+    return np.where(valid, F, -np.inf), jbest
+
+
+def _stderr_batch(inside, P, cp, u):
+    """Error estándar (método delta, como vol_star._pool_ratio_stderr) de F en (cp, u)."""
+    K, nz, n = inside.shape
+    pos_side = ((P[None] - cp[:, None, :]) @ u[:, :, None])[..., 0] >= 0    # (K, n)
+    n_in = inside.sum(axis=2)
+    pos = (inside & pos_side[:, None]).sum(axis=2)
+    p = np.minimum(pos, n_in - pos) / n
+    q = n_in / n
+    v = q.sum(axis=1)
+    Fv = np.where(v > 0, p.sum(axis=1) / np.maximum(v, 1e-300), 0.0)
+    var_num = (p * (1 - p)).sum(axis=1) / n
+    var_den = (q * (1 - q)).sum(axis=1) / n
+    cov = (p * (1 - q)).sum(axis=1) / n
+    var = (var_num - 2 * Fv * cov + Fv**2 * var_den) / np.maximum(v, 1e-300) ** 2
+    return np.where(v > 0, np.sqrt(np.maximum(var, 0.0)), 0.0)
+
+
+@profiling.timed("ortel_batch")
+def ortel_batch(As, bs, d, z_vals=None, N_cp=50, N_hip=1000, N=80_000, tol=1e-9,
+                target_mb=None, sampler="mc", rng=None, stats=None):
+    """
+    Versión por lotes de ortel(method="pool") para K politopos.
+
+    As, bs : listas de K descripciones (A_k, b_k) en R^{1+d} (o ya apiladas
+             con pad_polytopes).
+    N_cp, N_hip, N, tol, target_mb, sampler, rng: como en ortel; sampler
+             "mc", "sobol" o "halton" (la muestra es común a los K).
+
+    Si se entrega stats (dict), se llenan stats["F_stderr"] (K,) (método
+    delta en (bestCP, bestU)), stats["n_cand"] (K,) y stats["n_ineq"] (K,).
+
+    Devuelve una lista de K tuplas (bestCP (1+d,), bestF, bestU (d,)).
+    """
+    if z_vals is None:
+        z_vals = [0, 1]
+    z_vals = [int(z) for z in z_vals]
+    d = int(d)
+    A, b, n_ineq = pad_polytopes(As, bs)
+    if A.shape[2] != 1 + d:
+        raise ValueError(f"A tiene {A.shape[2]} columnas; d={d} ⇒ 1+d={1+d}.")
+    if sampler not in ("mc", "sobol", "halton"):
+        raise ValueError(f"sampler={sampler!r} no está soportado en ortel_batch "
+                         f"(usa 'mc', 'sobol' o 'halton').")
+    rng = make_rng(rng)
+    K = A.shape[0]
+
+    Ap = A[:, :, 1:]                                            # (K, m, d)
+    z = np.array(z_vals, dtype=float)
+    rhs = b[:, None, :] - A[:, None, :, 0] * z[None, :, None] + tol   # (K, |z|, m)
+
+    with profiling.stage("ortel_batch.inside"):
+        P = make_sampler(sampler, d, rng=rng)(int(N)).astype(float)
+        inside = _inside_batch(Ap, rhs, P, target_mb=target_mb)
+    profiling.count("samples_drawn", int(N))
+    profiling.count("samples_accepted", int(inside.sum()))
+
+    zi, pi, valid = _pick_candidates(inside, N_cp, rng)
+    U = _random_directions(d, N_hip, rng=rng)
+    with profiling.stage("ortel_batch.score"):
+        if U.shape[1] == 0:
+            F, jbest = np.where(valid, 1.0, -np.inf), np.zeros(valid.shape, dtype=np.int64)
+        else:
+            F, jbest = _score_batch(inside, P, pi, valid, U, target_mb=target_mb)
+    profiling.count("directions", int(valid.sum()) * U.shape[1])
+
+    kk = np.arange(K)
+    c = F.argmax(axis=1)
+    has = valid[kk, c]
+    bestF = np.where(has, F[kk, c], 0.0)
+    bestCP = np.zeros((K, 1 + d))
+    bestCP[:, 0] = z[zi[kk, c]]
+    bestCP[:, 1:] = P[pi[kk, c]]
+    bestU = U[:, jbest[kk, c]].T if U.shape[1] else np.zeros((K, d))
+    bestCP[~has] = 0.0
+    bestU = np.where(has[:, None], bestU, 0.0)
+
+    if stats is not None:
+        stats["F_stderr"] = np.where(has, _stderr_batch(inside, P, bestCP[:, 1:], bestU), np.nan)
+        stats["n_cand"] = valid.sum(axis=1)
+        stats["n_ineq"] = n_ineq
+
+    return [(bestCP[k].copy(), float(bestF[k]), bestU[k].copy()) for k in range(K)]
+
+
+def main():
+    from convex_hull import generate_convex_hull, random_vertices_by_fiber
+
+    p = argparse.ArgumentParser(description="K réplicas de ortel (método pool) en un solo lote.")
+    p.add_argument("--d", type=int, required=True)
+    p.add_argument("--z_vals", nargs="+", type=int, required=True)
+    p.add_argument("--n_per_z", type=int, default=5)
+    p.add_argument("--K", type=int, required=True, help="número de politopos (réplicas r = 0..K-1)")
+    p.add_argument("--N", type=int, required=True)
+    p.add_argument("--N_cp", type=int, required=True)
+    p.add_argument("--N_hip", type=int, required=True)
+    p.add_argument("--sampler", choices=["mc", "sobol", "halton"], default="mc")
+    p.add_argument("--target_mb", type=float, default=None)
+    p.add_argument("--seed", type=int, default=None,
+                   help="entropía raíz; el politopo r sale de SeedSequence(seed, spawn_key=(n_per_z, r))")
+    p.add_argument("--out", type=Path, required=True, help="NPZ de salida")
+    args = p.parse_args()
+
+    t0 = time.perf_counter()
+    root = np.random.SeedSequence(args.seed)
+    As, bs = [], []
+    for r in range(args.K):
+        ss = np.random.SeedSequence(root.entropy, spawn_key=(args.n_per_z, r))
+        rng_hull = np.random.default_rng(ss.spawn(2)[0])
+        verts = random_vertices_by_fiber(args.z_vals, args.d, args.n_per_z, rng=rng_hull)
+        A, b = generate_convex_hull(verts, rng=rng_hull)
+        As.append(A)
+        bs.append(b)
+    t_hull = time.perf_counter() - t0
+
+    stats = {}
+    rng = np.random.default_rng(np.random.SeedSequence(root.entropy, spawn_key=(args.n_per_z,)))
+    res = ortel_batch(As, bs, args.d, z_vals=args.z_vals, N_cp=args.N_cp, N_hip=args.N_hip,
+                      N=args.N, target_mb=args.target_mb, sampler=args.sampler, rng=rng,
+                      stats=stats)
+    t_search = time.perf_counter() - t0 - t_hull
+
+    A, b, n_ineq = pad_polytopes(As, bs)
+    F = np.array([r[1] for r in res])
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        args.out,
+        A=A, b=b, n_ineq=n_ineq, F=F, F_stderr=stats["F_stderr"],
+        bestcp=np.array([r[0] for r in res]), best_u=np.array([r[2] for r in res]),
+        d=np.int64(args.d), z_vals=np.array(args.z_vals, dtype=np.int64),
+        n_per_z=np.int64(args.n_per_z), N=np.int64(args.N), N_cp=np.int64(args.N_cp),
+        N_hip=np.int64(args.N_hip), sampler=args.sampler, seed_entropy=str(root.entropy),
+        seed_spawn_key=np.array([(args.n_per_z, r) for r in range(args.K)], dtype=np.int64),
+        t_hull=np.float64(t_hull), t_search=np.float64(t_search),
+    )
+    print(f"[OK] K={args.K}: F={F.mean():.4f}±{F.std():.4f} (min={F.min():.4f}) | "
+          f"hull {t_hull:.2f}s, búsqueda {t_search:.2f}s → {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
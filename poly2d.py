@@ -0,0 +1,161 @@
+# poly2d.py
+"""
+Geometría exacta para fibras en d = 2.
+
+Cada fibra S_z = { p ∈ [0,1]^2 : Ap p <= b - a0·z } es un polígono convexo.
+Aquí se construye explícitamente (recortando el cuadrado unitario) y sus áreas,
+y las de sus cortes por semiplanos que pasan por cp, se calculan con la fórmula
+del shoelace. Como el cuadrado tiene área 1, las áreas coinciden con los
+volúmenes relativos que estiman los métodos Monte Carlo de vol_star.py.
+"""
+import numpy as np
+from scipy.optimize import minimize_scalar
+
+_UNIT_SQUARE = np.array([[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]])
+
+
+def _clip_halfplane(P, a, c):
+    """Recorta el polígono convexo P (k, 2), en orden antihorario, con {p : a·p <= c}."""
+    k = P.shape[0]
+    if k == 0:
+        return P
+    s = P @ a - c  # <= 0 adentro
+    out = []
+    for i in range(k):
+        j = (i + 1) % k
+        in_i = s[i] <= 0
+        in_j = s[j] <= 0
+        if in_i:
+            out.append(P[i])
+        if in_i != in_j:
+            t = s[i] / (s[i] - s[j])
+            out.append(P[i] + t * (P[j] - P[i]))
+    if not out:
+        return np.empty((0, 2), dtype=float)
+    return np.asarray(out, dtype=float)
+
+
+def fiber_polygon(A, b, z, tol=1e-9):
+    """
+    Vértices (k, 2), en orden antihorario, de S_z = {p : Ap p <= b - a0·z} ∩ [0,1]^2.
+    Devuelve un arreglo vacío (0, 2) si la fibra es vacía.
+    """
+    A = np.asarray(A, float)
+    b = np.asarray(b, float)
+    if A.shape[1] != 3:
+        raise ValueError(f"A tiene {A.shape[1]} columnas; el caso exacto 2D requiere 1+d = 3.")
+
+    Ap = A[:, 1:]
+    b_shift = b - A[:, 0] * float(int(z))
+
+    P = _UNIT_SQUARE.copy()
+    for a_i, c_i in zip(Ap, b_shift):
+        P = _clip_halfplane(P, a_i, c_i + tol)
+        if P.shape[0] == 0:
+            break
+    return P
+
+
+def polygon_area(P):
+    """Área (con signo positivo para orden antihorario) por la fórmula del shoelace."""
+    if P.shape[0] < 3:
+        return 0.0
+    Q = np.roll(P, -1, axis=0)
+    return 0.5 * float(np.sum(P[:, 0] * Q[:, 1] - P[:, 1] * Q[:, 0]))
+
+
+def split_areas(P, c, U):
+    """
+    Área de P ∩ {p : (p - c)·u >= 0} para cada columna u de U (2, n_dir).
+
+    Con coordenadas centradas en c, la cuerda del corte pasa por el origen y no
+    aporta al shoelace: el área positiva es 1/2 · sum_e frac_e(u) · (q0_e × q1_e),
+    donde frac_e es la fracción de la arista e que queda del lado positivo.
+    Vectorizado sobre direcciones; costo O(#vértices · n_dir).
+
+    Devuelve un arreglo (n_dir,).
+    """
+    n_dir = U.shape[1]
+    if P.shape[0] < 3:
+        return np.zeros(n_dir, dtype=float)
+
+    Q0 = P - np.asarray(c, float)
+    Q1 = np.roll(Q0, -1, axis=0)
+    cross = Q0[:, 0] * Q1[:, 1] - Q0[:, 1] * Q1[:, 0]   # (k,)
+
+    s0 = Q0 @ U                                         # (k, n_dir)
+    s1 = Q1 @ U
+    pos0 = s0 >= 0
+    pos1 = s1 >= 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = s0 / (s0 - s1)                              # cruce de la arista con la recta
+    frac = np.where(
+        pos0 & pos1, 1.0,
+        np.where(pos0 & ~pos1, t, np.where(~pos0 & pos1, 1.0 - t, 0.0)),
+    )
+    return 0.5 * (cross @ frac)
+
+
+def _min_sides_angles(polys, c, theta):
+    """sum_z min(Área^+, Área^-) para normales u = (cos θ, sin θ); polys = [(P, área)]."""
+    theta = np.atleast_1d(np.asarray(theta, float))
+    U = np.vstack([np.cos(theta), np.sin(theta)])
+    out = np.zeros(theta.shape[0], dtype=float)
+    for P, area in polys:
+        pos = np.clip(split_areas(P, c, U), 0.0, area)
+        out += np.minimum(pos, area - pos)
+    return out
+
+
+def worst_cut_sweep(polys, c, n_grid=8, xatol=1e-12):
+    """
+    Minimiza g(θ) = sum_z min(Área(S_z ∩ H_u^+), Área(S_z ∩ H_u^-)) sobre la normal
+    u = (cos θ, sin θ) de la recta que pasa por c.
+
+    g tiene período π (u y -u dan el mismo corte) y es suave salvo en los ángulos
+    críticos donde la recta pasa por un vértice de algún polígono. Se ordenan esos
+    ángulos y, en cada arco entre dos consecutivos, se evalúa g en una grilla
+    (incluyendo los extremos) y se refina el mejor tramo con Brent acotado.
+
+    polys : lista de (P, área) con P (k, 2) en orden antihorario.
+
+    Devuelve (g_min, u_star) con u_star de shape (2,).
+    """
+    c = np.asarray(c, float)
+    crit = [np.zeros(1)]
+    for P, _ in polys:
+        q = P - c
+        crit.append((np.arctan2(q[:, 1], q[:, 0]) + 0.5 * np.pi) % np.pi)
+    crit = np.unique(np.concatenate(crit))
+    crit = np.append(crit, np.pi)
+
+    a0, a1 = crit[:-1], crit[1:]
+    keep = (a1 - a0) > 1e-15
+    a0, a1 = a0[keep], a1[keep]
+
+    ts = np.linspace(0.0, 1.0, int(n_grid) + 2)
+    TH = a0[:, None] + (a1 - a0)[:, None] * ts[None, :]      # (n_arcos, n_grid+2)
+    G = _min_sides_angles(polys, c, TH.ravel()).reshape(TH.shape)
+
+    k = int(np.argmin(G))
+    best_val = float(G.flat[k])
+    best_th = float(TH.flat[k])
+
+    last = TH.shape[1] - 1
+    for i in range(TH.shape[0]):
+        j = int(np.argmin(G[i]))
+        lo = TH[i, max(j - 1, 0)]
+        hi = TH[i, min(j + 1, last)]
+        if hi - lo <= xatol:
+            continue
+        res = minimize_scalar(
+            lambda t: float(_min_sides_angles(polys, c, t)[0]),
+            bounds=(lo, hi), method="bounded", options={"xatol": xatol},
+        )
+        if res.fun < best_val:
+            best_val = float(res.fun)
+            best_th = float(res.x)
+
+    u_star = np.array([np.cos(best_th), np.sin(best_th)])
+    return best_val, u_star
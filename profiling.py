@@ -0,0 +1,135 @@
+# profiling.py
+"""
+Instrumentación liviana del camino caliente: tiempos por etapa y contadores,
+globales al proceso.
+
+    with profiling.stage("hull"): ...      tiempo de pared acumulado y llamadas
+    @profiling.timed("ratio_cp")            lo mismo para una función entera
+    profiling.count("cp_rejected")          contador (suma)
+    profiling.value("n_ineq", A.shape[0])   valor (se guarda el último)
+
+run_experiment llama a reset() al empezar una réplica y a snapshot() al final;
+el resultado va al NPZ / registro (to_record) y como línea JSON (to_json).
+
+Los tiempos son inclusivos (una etapa anidada también cuenta en la de afuera)
+y, con hilos, se suman entre hilos: con --threads > 1 "ratio_cp" puede superar
+el tiempo de pared de "ortel". Todo pasa por un lock; las llamadas son por
+lote o por candidato, no por punto, así que el costo es despreciable.
+ORTEL_PROFILE=0 lo desactiva.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+ENABLED = os.environ.get("ORTEL_PROFILE", "1") != "0"
+
+_lock = threading.Lock()
+_times = defaultdict(float)
+_calls = defaultdict(int)
+_counts = defaultdict(int)
+_values = {}
+
+
+def reset():
+    """Borra todos los tiempos, contadores y valores."""
+    with _lock:
+        _times.clear()
+        _calls.clear()
+        _counts.clear()
+        _values.clear()
+
+
+@contextmanager
+def stage(name):
+    """Acumula el tiempo de pared del bloque en la etapa name."""
+    if not ENABLED:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        with _lock:
+            _times[name] += dt
+            _calls[name] += 1
+
+
+def timed(name):
+    """Decorador: cada llamada a la función cuenta como la etapa name."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def count(name, n=1):
+    """Suma n al contador name."""
+    if ENABLED:
+        with _lock:
+            _counts[name] += int(n)
+
+
+def value(name, v):
+    """Guarda v (número) como valor de name; una llamada posterior lo reemplaza."""
+    if ENABLED:
+        with _lock:
+            _values[name] = float(v)
+
+
+def snapshot():
+    """
+    Copia del estado actual: dict con "times" {etapa: s}, "calls" {etapa: n},
+    "counts" {contador: n} y "values" {nombre: v}, con claves ordenadas.
+    """
+    with _lock:
+        return {
+            "times": {k: _times[k] for k in sorted(_times)},
+            "calls": {k: _calls[k] for k in sorted(_calls)},
+            "counts": {k: _counts[k] for k in sorted(_counts)},
+            "values": {k: _values[k] for k in sorted(_values)},
+        }
+
+
+def to_record(snap):
+    """
+    Campos de NPZ (sin objetos Python, se leen con allow_pickle=False) de un
+    snapshot: prof_stages / prof_time / prof_calls y prof_counters / prof_counts
+    (los valores van junto a los contadores, como float).
+    """
+    names = list(snap["counts"]) + list(snap["values"])
+    return {
+        "prof_stages": np.array(list(snap["times"]), dtype=str),
+        "prof_time": np.array(list(snap["times"].values()), dtype=np.float64),
+        "prof_calls": np.array(list(snap["calls"].values()), dtype=np.int64),
+        "prof_counters": np.array(names, dtype=str),
+        "prof_counts": np.array(list(snap["counts"].values()) + list(snap["values"].values()),
+                                dtype=np.float64),
+    }
+
+
+def from_record(rec):
+    """Inverso de to_record: snapshot a partir de un NPZ / registro cargado."""
+    if "prof_stages" not in rec:
+        return None
+    stages = [str(s) for s in rec["prof_stages"]]
+    return {
+        "times": dict(zip(stages, map(float, rec["prof_time"]))),
+        "calls": dict(zip(stages, map(int, rec["prof_calls"]))),
+        "counts": dict(zip(map(str, rec["prof_counters"]), map(float, rec["prof_counts"]))),
+        "values": {},
+    }
+
+
+def to_json(snap, **extra):
+    """Una línea JSON con los campos extra (id, n_per_z, F, ...) y el snapshot."""
+    return json.dumps({**extra, **snap}, default=float)
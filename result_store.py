@@ -0,0 +1,171 @@
+# result_store.py
+"""
+Almacén de resultados solo-agregar, en vez de dos NPZ por réplica.
+
+    <root>/shards/<writer>_<k>.bin   registros concatenados: 8 bytes (uint64 LE)
+                                     con el largo, y luego un NPZ comprimido con
+                                     todos los campos de la réplica (A, b, F,
+                                     bestcp, best_u, verts, parámetros, tiempos).
+                                     Se abre un archivo nuevo cada chunk_mb MiB.
+    <root>/index/<writer>.csv        una fila por réplica: id, n_per_z, route
+                                     ("hulls" / "hulls_obs" / "partial"), F, ..., y dónde
+                                     está el registro (shard, offset, length).
+    <root>/logs/<writer>.log         errores de réplicas fallidas.
+
+Cada proceso escribe solo sus propios archivos (writer), así que no hay locks.
+La fila del índice se escribe después de que el registro está en disco: un
+corte a mitad de camino deja bytes sobrantes al final del shard, pero nunca
+una fila que apunte a un registro incompleto.
+
+export_legacy reconstruye la estructura antigua results/<route>/<fecha>/
+result_*.npz + verts_*.npz.
+"""
+import csv
+import io
+import os
+import socket
+import struct
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+INDEX_FIELDS = [
+    "id", "n_per_z", "route", "F", "F_stderr", "d", "seed_entropy", "seed_spawn_key",
+    "timestamp", "shard", "offset", "length",
+]
+# campos del NPZ de vértices en la estructura antigua (el resto va a result_*.npz)
+_VERTS_FIELDS = ("verts", "d", "z_vals", "n_per_z", "timestamp", "saved_dir", "file_tag")
+_LEN = struct.Struct("<Q")
+
+
+def default_writer():
+    """Identificador de escritor único por proceso: host_pid."""
+    return f"{socket.gethostname()}_{os.getpid()}"
+
+
+class ResultStore:
+    """
+    Escritor de un almacén en root. writer identifica los archivos propios de
+    este proceso (por defecto host_pid).
+    """
+
+    def __init__(self, root, writer=None, chunk_mb=256.0):
+        self.root = Path(root)
+        self.writer = writer or default_writer()
+        self.chunk_bytes = int(float(chunk_mb) * 2**20)
+        for sub in ("shards", "index", "logs"):
+            (self.root / sub).mkdir(parents=True, exist_ok=True)
+        # nunca se reabre un chunk viejo: un corte pudo dejar bytes sueltos al final
+        self._k = len(list((self.root / "shards").glob(f"{self.writer}_*.bin")))
+        self._shard = None
+        self.index_path = self.root / "index" / f"{self.writer}.csv"
+        self.log_path = self.root / "logs" / f"{self.writer}.log"
+
+    def _shard_path(self):
+        if self._shard is None or self._shard.stat().st_size >= self.chunk_bytes:
+            self._shard = self.root / "shards" / f"{self.writer}_{self._k:04d}.bin"
+            self._k += 1
+        return self._shard
+
+    def append(self, record, row):
+        """
+        Agrega record (dict de arreglos/escalares, sin objetos Python) y su fila
+        de índice row (dict con las claves de INDEX_FIELDS que se conozcan).
+        Devuelve la ruta lógica "shards/<archivo>#<offset>".
+        """
+        buf = io.BytesIO()
+        np.savez_compressed(buf, **record)
+        blob = buf.getvalue()
+
+        path = self._shard_path()
+        with open(path, "ab") as fh:
+            offset = fh.tell()
+            fh.write(_LEN.pack(len(blob)))
+            fh.write(blob)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+        row = dict(row, shard=path.name, offset=offset, length=len(blob))
+        new = not self.index_path.exists()
+        with open(self.index_path, "a", newline="", encoding="utf-8") as fh:
+            w = csv.DictWriter(fh, fieldnames=INDEX_FIELDS, extrasaction="ignore")
+            if new:
+                w.writeheader()
+            w.writerow(row)
+        return f"shards/{path.name}#{offset}"
+
+    def log(self, text):
+        """Agrega texto (p. ej. un traceback) al log de este escritor."""
+        with open(self.log_path, "a", encoding="utf-8") as fh:
+            fh.write(text.rstrip("\n") + "\n")
+
+
+def read_index(root):
+    """Filas (dicts de str) de todos los índices del almacén."""
+    rows = []
+    for f in sorted((Path(root) / "index").glob("*.csv")):
+        with open(f, newline="", encoding="utf-8") as fh:
+            rows.extend(csv.DictReader(fh))
+    return rows
+
+
+def load_record(root, row):
+    """Registro completo (dict de np.ndarray) de una fila del índice."""
+    path = Path(root) / "shards" / row["shard"]
+    with open(path, "rb") as fh:
+        fh.seek(int(row["offset"]))
+        (n,) = _LEN.unpack(fh.read(_LEN.size))
+        blob = fh.read(n)
+    if len(blob) != n:
+        raise ValueError(f"registro truncado en {path} (offset {row['offset']}).")
+    with np.load(io.BytesIO(blob), allow_pickle=False) as z:
+        return {k: z[k] for k in z.files}
+
+
+def iter_records(root, route=None):
+    """(fila, registro) de cada réplica, opcionalmente solo de una ruta."""
+    for row in read_index(root):
+        if route is None or row["route"] == route:
+            yield row, load_record(root, row)
+
+
+def export_legacy(root, out_root, route=None):
+    """
+    Escribe cada registro como en la versión anterior:
+    out_root/<route>/<YYYY-MM-DD>/result_<tag>.npz y verts_<tag>.npz.
+    Devuelve la lista de rutas result_*.npz escritas.
+    """
+    out_root = Path(out_root)
+    written = []
+    for row, rec in iter_records(root, route=route):
+        ts = str(rec["timestamp"])
+        day = datetime.strptime(ts, "%Y%m%d%H%M%S").strftime("%Y-%m-%d")
+        day_dir = out_root / row["route"] / day
+        day_dir.mkdir(parents=True, exist_ok=True)
+        tag = str(rec["file_tag"])
+        rec["saved_dir"] = np.array(str(day_dir))
+
+        result = {k: v for k, v in rec.items() if k != "verts"}
+        verts = {k: rec[k] for k in _VERTS_FIELDS if k in rec}
+        np.savez_compressed(day_dir / f"result_{tag}.npz", **result)
+        np.savez_compressed(day_dir / f"verts_{tag}.npz", **verts)
+        written.append(day_dir / f"result_{tag}.npz")
+    return written
+
+
+def main():
+    import argparse
+
+    p = argparse.ArgumentParser(description="Exporta un almacén de resultados a NPZ sueltos.")
+    p.add_argument("store", type=Path, help="raíz del almacén")
+    p.add_argument("out", type=Path, help="carpeta destino (estructura <route>/<fecha>/)")
+    p.add_argument("--route", choices=["hulls", "hulls_obs", "partial"], default=None)
+    args = p.parse_args()
+    n = len(export_legacy(args.store, args.out, route=args.route))
+    print(f"[OK] {n} réplicas exportadas a {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
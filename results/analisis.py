@@ -4,168 +4,330 @@
 """
 analisis_resultados.py
 
-Lee todos los archivos result_*.npz dentro de results/** (hulls y hulls_obs),
-construye un DataFrame con:
+Lee todos los archivos result_*.npz dentro de results/** (hulls y hulls_obs)
+y los registros del almacén results/store (result_store.py), y construye un
+DataFrame con:
     - n_per_z
     - F
     - bestcp (vector 3D sin separarlo)
     - best_u (vector de dimensión d, sin separarlo)
 
+La lectura es incremental: el resumen por archivo queda en
+results/analisis_cache.csv junto con su mtime (entero, en ns) y su tamaño, y en
+cada corrida solo se leen (en paralelo) los archivos nuevos o modificados; del
+almacén solo se cargan los registros que no estaban en el caché. Con
+--check_cache se actualiza el caché dos veces y falla si la segunda pasada
+vuelve a leer algún archivo.
+
 Luego calcula estadísticas y crea dos gráficos:
     1) Histograma por n_per_z con transparencias
     2) Boxplot por n_per_z estilo limpio
 """
 
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
-from pathlib import Path
 import matplotlib.pyplot as plt
 
-# === Estilo bonito para gráficos ===
-plt.style.use("seaborn-v0_8-muted")
-
 # === Configuración de paths ===
-BASE = Path("/home/maria/Evaluaci-n-Num-rica-de-la-Conjetura-de-Oertel-para-el-caso-unidimensional")
+BASE = Path(__file__).resolve().parent.parent
 
-# Ahora buscamos en TODO results (hulls + hulls_obs)
+# Ahora buscamos en TODO results (hulls + hulls_obs + store)
 RESULTS_DIR = BASE / "results"
+STORE_DIR = RESULTS_DIR / "store"
+CACHE_CSV = RESULTS_DIR / "analisis_cache.csv"
 
-rows = []
-n_files = 0
-n_ok = 0
-n_err = 0
-
-print(f"Buscando archivos result_*.npz en {RESULTS_DIR} ...")
-
-# === Leer todos los .npz (tanto de hulls como de hulls_obs) ===
-for npz_path in RESULTS_DIR.rglob("result_*.npz"):
-    n_files += 1
-
-    try:
-        data = np.load(npz_path, allow_pickle=True)
-
-        # Solo archivos de PUNTOS, no vértices
-        if "F" not in data or "bestcp" not in data:
-            continue
+# Hilos para leer NPZ nuevos (la descompresión suelta el GIL)
+N_READERS = int(os.environ.get("ANALISIS_THREADS", min(16, os.cpu_count() or 4)))
 
-        F = float(data["F"])
-        n_per_z = int(data["n_per_z"])
-        bestcp = np.array(data["bestcp"], dtype=float)
+SKIP = "sin F o bestcp, o parcial"  # no son errores: se omiten sin avisar
 
-        if bestcp.shape != (3,):
-            raise ValueError(f"bestcp tiene shape raro {bestcp.shape}")
+CACHE_COLS = ["file", "mtime_ns", "size", "folder", "n_per_z", "F", "bestcp", "best_u", "error"]
 
-        # best_u: puede no existir en archivos viejos
-        if "best_u" in data:
-            best_u = np.array(data["best_u"], dtype=float)
-        else:
-            best_u = None  # para que no explote con archivos antiguos
 
-        rows.append({
-            "file": str(npz_path),
-            "folder": npz_path.parent.name,
-            "n_per_z": n_per_z,
-            "F": F,
-            "bestcp": bestcp,
-            "best_u": best_u,
-        })
+def _vec_to_str(v):
+    return "" if v is None else " ".join(repr(float(x)) for x in np.ravel(v))
 
-        n_ok += 1
 
-    except Exception as e:
-        print(f"❌ Error leyendo {npz_path}: {e}")
-        n_err += 1
-
-
-# === Crear DataFrame ===
-df = pd.DataFrame(rows)
-
-print(f"\nArchivos encontrados (result_*.npz): {n_files}")
-print(f"Archivos válidos (con F y bestcp): {n_ok}")
-print(f"Archivos con error: {n_err}")
-
-if df.empty:
-    print("⚠️ No se encontró ningún archivo válido con F y bestcp.")
-    raise SystemExit(0)
+def _str_to_vec(s):
+    if not isinstance(s, str) or not s:
+        return None
+    return np.array([float(x) for x in s.split()], dtype=float)
 
 
-# === Estadísticas numéricas ===
+def _summary_row(file, folder, data):
+    """Fila del caché a partir de un NPZ (o registro) ya abierto."""
+    # Solo archivos de PUNTOS, no vértices
+    if "F" not in data or "bestcp" not in data:
+        return None
+    # Réplicas cortadas por --time_budget: F parcial, se completan al retomarlas
+    if "timed_out" in data and bool(data["timed_out"]):
+        return None
 
-print("\nPrimeras filas:")
-print(df.head())
+    bestcp = np.array(data["bestcp"], dtype=float)
+    if bestcp.shape != (3,):
+        raise ValueError(f"bestcp tiene shape raro {bestcp.shape}")
 
-print("\nNaN por columna (solo n_per_z y F):")
-print(df[["n_per_z", "F"]].isna().sum())
+    # best_u: puede no existir en archivos viejos
+    best_u = np.array(data["best_u"], dtype=float) if "best_u" in data else None
 
-print("\n.describe() global (n_per_z y F):")
-print(df[["n_per_z", "F"]].describe())
+    return {
+        "file": file,
+        "folder": folder,
+        "n_per_z": int(data["n_per_z"]),
+        "F": float(data["F"]),
+        "bestcp": _vec_to_str(bestcp),
+        "best_u": _vec_to_str(best_u),
+        "error": "",
+    }
 
-print("\n.describe() de F por n_per_z:")
-print(df.groupby("n_per_z")["F"].describe())
 
+def _stamp(path):
+    """(mtime en ns, tamaño): enteros, así que se guardan y releen exactos en el CSV."""
+    st = path.stat()
+    return int(st.st_mtime_ns), int(st.st_size)
 
-# === Guardar CSV con todas las columnas (incluye bestcp y best_u) ===
-out_csv = BASE / "results" / "analisis_resultados_simple.csv"
-df.to_csv(out_csv, index=False)
-print(f"\n✅ CSV guardado en: {out_csv}")
 
+def _read_npz(path, stamp):
+    """Resumen de un result_*.npz; errores quedan en la fila (y no se reintentan)."""
+    try:
+        with np.load(path) as data:
+            row = _summary_row(str(path), path.parent.name, data)
+    except Exception as e:
+        row = {"file": str(path), "error": f"{type(e).__name__}: {e}"}
+    if row is None:
+        row = {"file": str(path), "error": SKIP}
+    row["mtime_ns"], row["size"] = stamp
+    return row
+
+
+def _load_cache():
+    if not CACHE_CSV.exists():
+        return pd.DataFrame(columns=CACHE_COLS)
+    text = ["file", "folder", "bestcp", "best_u", "error"]
+    cache = pd.read_csv(CACHE_CSV, dtype={**dict.fromkeys(text, str), "mtime_ns": "Int64",
+                                          "size": "Int64"})
+    if not {"mtime_ns", "size"} <= set(cache.columns):
+        # caché de una versión anterior (mtime en float): se rehace una vez
+        return pd.DataFrame(columns=CACHE_COLS)
+    cache[text] = cache[text].fillna("")
+    return cache
+
+
+def _scan_npz(cache):
+    """Filas del caché para los result_*.npz actuales; lee solo nuevos/modificados."""
+    known = {f: (int(m), int(n))
+             for f, m, n in zip(cache["file"], cache["mtime_ns"], cache["size"])}
+    current = {}
+    for npz_path in RESULTS_DIR.rglob("result_*.npz"):
+        current[str(npz_path)] = (npz_path, _stamp(npz_path))
+
+    keep = cache[cache["file"].map(
+        lambda f: f in current and known[f] == current[f][1]
+    )]
+    todo = [(p, m) for f, (p, m) in current.items() if known.get(f) != m]
+
+    new_rows = []
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, N_READERS)) as ex:
+            new_rows = list(ex.map(lambda pm: _read_npz(*pm), todo))
+    return keep, new_rows, len(current), len(todo)
+
+
+def _scan_store(cache):
+    """Filas del caché para los registros del almacén; carga solo los nuevos."""
+    if not (STORE_DIR / "index").exists():
+        return cache.iloc[0:0], [], 0, 0
+    sys.path.insert(0, str(BASE))
+    from result_store import load_record, read_index
+
+    rows = read_index(STORE_DIR)
+    keys = {f"store:{r['shard']}#{r['offset']}": r for r in rows}
+    keep = cache[cache["file"].isin(keys)]
+    known = set(keep["file"])
+    todo = [(k, r) for k, r in keys.items() if k not in known]
+
+    def _one(kr):
+        key, r = kr
+        try:
+            row = _summary_row(key, r["route"], load_record(STORE_DIR, r))
+        except Exception as e:
+            row = {"file": key, "error": f"{type(e).__name__}: {e}"}
+        row = row or {"file": key, "error": SKIP}
+        row["mtime_ns"], row["size"] = 0, 0  # los registros no cambian
+        return row
+
+    new_rows = []
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, N_READERS)) as ex:
+            new_rows = list(ex.map(_one, todo))
+    return keep, new_rows, len(keys), len(todo)
+
+
+def update_cache(stats=None):
+    """
+    Actualiza results/analisis_cache.csv y lo devuelve como DataFrame. Si se
+    entrega stats (dict), se llenan stats["n_read"] y stats["n_read_store"]
+    (NPZ y registros leídos en esta pasada).
+    """
+    cache = _load_cache()
+    is_store = cache["file"].astype(str).str.startswith("store:")
+
+    keep_npz, new_npz, n_npz, n_read = _scan_npz(cache[~is_store])
+    keep_st, new_st, n_st, n_read_st = _scan_store(cache[is_store])
+
+    parts = [df for df in (keep_npz, keep_st, pd.DataFrame(new_npz + new_st)) if not df.empty]
+    summary = (pd.concat(parts, ignore_index=True) if parts
+               else pd.DataFrame(columns=CACHE_COLS)).reindex(columns=CACHE_COLS)
+    tmp = CACHE_CSV.with_suffix(".tmp")
+    summary.to_csv(tmp, index=False)
+    os.replace(tmp, CACHE_CSV)
+
+    print(f"result_*.npz: {n_npz} (leídos ahora: {n_read}) | "
+          f"registros del almacén: {n_st} (leídos ahora: {n_read_st})")
+    if stats is not None:
+        stats.update(n_read=n_read, n_read_store=n_read_st)
+    return summary
+
+
+def check_cache():
+    """
+    Actualiza el caché dos veces seguidas: la segunda pasada, sin cambios en
+    results/, no debe leer ningún NPZ ni registro. Devuelve 0 si es así.
+    """
+    update_cache()
+    stats = {}
+    update_cache(stats)
+    if stats["n_read"] or stats["n_read_store"]:
+        print(f"❌ El caché no se reutilizó: {stats['n_read']} NPZ y "
+              f"{stats['n_read_store']} registros se leyeron de nuevo sin cambios.")
+        return 1
+    print("✅ Segunda pasada sin lecturas: el caché se reutiliza.")
+    return 0
+
+
+def main():
+    p = argparse.ArgumentParser(description="Resumen y gráficos de los resultados de ortel.")
+    p.add_argument("--check_cache", action="store_true",
+                   help="solo comprobar que una segunda pasada sin cambios no relee archivos")
+    if p.parse_args().check_cache:
+        return check_cache()
+
+    print(f"Buscando archivos result_*.npz en {RESULTS_DIR} ...")
+    summary = update_cache()
+
+    errors = summary[summary["error"].fillna("") != ""]
+    for _, r in errors.iterrows():
+        if r["error"] != SKIP:
+            print(f"❌ Error leyendo {r['file']}: {r['error']}")
+
+    # === Crear DataFrame ===
+    df = summary[summary["error"].fillna("") == ""].copy()
+    df["n_per_z"] = df["n_per_z"].astype(float).astype(int)
+    df["F"] = df["F"].astype(float)
+    df["bestcp"] = df["bestcp"].map(_str_to_vec)
+    df["best_u"] = df["best_u"].map(_str_to_vec)
+    df = df[["file", "folder", "n_per_z", "F", "bestcp", "best_u"]].reset_index(drop=True)
+
+    print(f"\nArchivos encontrados: {len(summary)}")
+    print(f"Archivos válidos (con F y bestcp): {len(df)}")
+    print(f"Archivos con error: {int((errors['error'] != SKIP).sum())}")
+
+    if df.empty:
+        print("⚠️ No se encontró ningún archivo válido con F y bestcp.")
+        return 0
+
+    # === Estadísticas numéricas ===
+
+    print("\nPrimeras filas:")
+    print(df.head())
+
+    print("\nNaN por columna (solo n_per_z y F):")
+    print(df[["n_per_z", "F"]].isna().sum())
+
+    print("\n.describe() global (n_per_z y F):")
+    print(df[["n_per_z", "F"]].describe())
+
+    print("\n.describe() de F por n_per_z:")
+    print(df.groupby("n_per_z")["F"].describe())
+
+    # === Guardar CSV con todas las columnas (incluye bestcp y best_u) ===
+    out_csv = BASE / "results" / "analisis_resultados_simple.csv"
+    df.to_csv(out_csv, index=False)
+    print(f"\n✅ CSV guardado en: {out_csv}")
+
+    plot(df)
+    return 0
+
+
+def plot(df):
+    # === Estilo bonito para gráficos ===
+    plt.style.use("seaborn-v0_8-muted")
+
+    # ============================================================
+    #  📌 GRÁFICO 1 — Histograma por n_per_z
+    # ============================================================
+
+    plt.figure(figsize=(12, 6))
+
+    unique_n = sorted(df["n_per_z"].unique())
+    colors = ["#ffcc66", "#66b3ff", "#66cc99", "#ffdd77", "#6699cc"]
+
+    for i, n in enumerate(unique_n):
+        subset = df[df["n_per_z"] == n]["F"]
+        plt.hist(
+            subset,
+            bins=20,
+            alpha=0.45,
+            color=colors[i % len(colors)],
+            label=f"n={n}",
+        )
+
+    # Líneas verticales teóricas
+    plt.axvline(1 / (2 * np.e), color="red", linestyle="--", linewidth=2,
+                label="1/(2e) ≈ 0.184")
+    plt.axvline(2 / 9, color="green", linestyle="--", linewidth=2,
+                label="2/9 ≈ 0.222")
+
+    plt.title("Distribución de $F(S)$ por número de puntos por fibra", fontsize=16)
+    plt.xlabel("Radio estimado $F(S)$", fontsize=14)
+    plt.ylabel("Frecuencia", fontsize=14)
+    plt.legend()
+    plt.tight_layout()
+    plt.show()
+
+    # ============================================================
+    #  📌 GRÁFICO 2 — Boxplot por n_per_z
+    # ============================================================
+
+    plt.figure(figsize=(11, 6))
+
+    df.boxplot(
+        column="F",
+        by="n_per_z",
+        grid=True,
+        boxprops=dict(color="navy"),
+        medianprops=dict(color="red"),
+    )
 
-# ============================================================
-#  📌 GRÁFICO 1 — Histograma por n_per_z
-# ============================================================
-
-plt.figure(figsize=(12, 6))
+    plt.axhline(1 / (2 * np.e), color="red", linestyle="--", linewidth=2,
+                label="1/(2e) ≈ 0.184")
+    plt.axhline(2 / 9, color="green", linestyle="--", linewidth=2,
+                label="2/9 ≈ 0.222")
 
-unique_n = sorted(df["n_per_z"].unique())
-colors = ["#ffcc66", "#66b3ff", "#66cc99", "#ffdd77", "#6699cc"]
+    plt.title("Variabilidad de $F(S)$ según $n_{per_z}$", fontsize=15)
+    plt.suptitle("")
+    plt.xlabel("Número de puntos por fibra $n_{per_z}$", fontsize=14)
+    plt.ylabel("Radio estimado $F(S)$", fontsize=14)
+    plt.legend()
+    plt.tight_layout()
+    plt.show()
 
-for i, n in enumerate(unique_n):
-    subset = df[df["n_per_z"] == n]["F"]
-    plt.hist(
-        subset,
-        bins=20,
-        alpha=0.45,
-        color=colors[i % len(colors)],
-        label=f"n={n}",
-    )
 
-# Líneas verticales teóricas
-plt.axvline(1 / (2 * np.e), color="red", linestyle="--", linewidth=2,
-            label="1/(2e) ≈ 0.184")
-plt.axvline(2 / 9, color="green", linestyle="--", linewidth=2,
-            label="2/9 ≈ 0.222")
-
-plt.title("Distribución de $F(S)$ por número de puntos por fibra", fontsize=16)
-plt.xlabel("Radio estimado $F(S)$", fontsize=14)
-plt.ylabel("Frecuencia", fontsize=14)
-plt.legend()
-plt.tight_layout()
-plt.show()
-
-
-# ============================================================
-#  📌 GRÁFICO 2 — Boxplot por n_per_z
-# ============================================================
-
-plt.figure(figsize=(11, 6))
-
-df.boxplot(
-    column="F",
-    by="n_per_z",
-    grid=True,
-    boxprops=dict(color="navy"),
-    medianprops=dict(color="red"),
-)
-
-plt.axhline(1 / (2 * np.e), color="red", linestyle="--", linewidth=2,
-            label="1/(2e) ≈ 0.184")
-plt.axhline(2 / 9, color="green", linestyle="--", linewidth=2,
-            label="2/9 ≈ 0.222")
-
-plt.title("Variabilidad de $F(S)$ según $n_{per_z}$", fontsize=15)
-plt.suptitle("")
-plt.xlabel("Número de puntos por fibra $n_{per_z}$", fontsize=14)
-plt.ylabel("Radio estimado $F(S)$", fontsize=14)
-plt.legend()
-plt.tight_layout()
-plt.show()
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,15 +1,29 @@
 #!/usr/bin/env python3
 # ===========================================================
-# run_ortel_parallel.py — versión seedless (NPZ only)
-# Ejecuta varias réplicas en paralelo llamando a main_ortel.py
+# run_ortel_parallel.py — NPZ only, semillas por SeedSequence
+# Ejecuta varias réplicas en paralelo con main_ortel.run_experiment
+# dentro de workers persistentes (un intérprete por worker, no por réplica).
+# Las réplicas viven en un manifiesto de campaña (campaign.py): al relanzar
+# solo se corren las que faltan, y en un job array cada tarea toma su shard.
+# Con ORTEL_WALLTIME las réplicas cortadas por tiempo se guardan como parciales
+# y se retoman desde su checkpoint al relanzar.
 # ===========================================================
 import os
 import sys
+import time
 import uuid
-import subprocess
+import tempfile
+import traceback
+from collections import defaultdict
 from pathlib import Path
+from typing import Optional
 from concurrent.futures import ProcessPoolExecutor, as_completed
-from datetime import datetime
+
+import numpy as np
+
+import campaign
+from main_ortel import build_parser, run_experiment
+from result_store import ResultStore, default_writer
 
 # ===== Configuración general =====
 # Aquí cada clave es "n_per_z": puntos por fibra
@@ -35,15 +49,44 @@ Z_VALS    = [0, 1, 2]        # tres fibras
 F_THRESH  = 0.18
 TARGET_MB = 64.0
 
+# Semilla raíz de la corrida: cada réplica usa SeedSequence(SEED, spawn_key=(n_per_z, r)),
+# con r el índice de la réplica; así agregar claves a POINTS_AND_REPS no cambia las demás.
+# None => entropía del sistema; queda en el manifiesto y se reutiliza al retomar.
+SEED = int(os.environ["ORTEL_SEED"]) if "ORTEL_SEED" in os.environ else None
+
+# Resultados en un almacén solo-agregar (result_store.py); ORTEL_STORE=0 vuelve
+# a los NPZ sueltos en results/<hulls|hulls_obs>/<fecha>/
+USE_STORE = os.environ.get("ORTEL_STORE", "1") != "0"
+
+# Campaña (manifiesto + estado por shard) y corte tras K fallas seguidas
+CAMPAIGN         = os.environ.get("ORTEL_CAMPAIGN", "default")
+MAX_CONSEC_FAILS = int(os.environ.get("ORTEL_MAX_FAILS", 5))
+
+# Segundos disponibles para toda la corrida (p. ej. el -t de SLURM menos un margen
+# para guardar). Las réplicas en curso al llegar el límite se guardan como
+# parciales con un checkpoint y las que no empezaron quedan pendientes: al
+# relanzar, la campaña las retoma donde quedaron. Sin ORTEL_WALLTIME no hay límite.
+WALLTIME = float(os.environ["ORTEL_WALLTIME"]) if "ORTEL_WALLTIME" in os.environ else None
+CKPT_EVERY = float(os.environ.get("ORTEL_CKPT_EVERY", 120.0))
+
+# Descripción mínima del politopo (main_ortel --min_hull): menos filas en A,
+# mismas fibras; ORTEL_MIN_HULL=1 la activa
+MIN_HULL = os.environ.get("ORTEL_MIN_HULL", "0") != "0"
+
+# Paralelismo interno: hilos por réplica (--threads de main_ortel)
+THREADS = int(os.environ.get("ORTEL_THREADS", 1))
+
 # Paralelismo externo (procesos independientes)
-# 👇 CAMBIO IMPORTANTE: usar los CPUs que SLURM asigna (ej: 16)
-NUM_WORKERS = int(os.environ.get("SLURM_CPUS_PER_TASK", os.cpu_count() or 8))
+# 👇 CAMBIO IMPORTANTE: usar los CPUs que SLURM asigna (ej: 16), repartidos en THREADS por réplica
+NUM_WORKERS = max(1, int(os.environ.get("SLURM_CPUS_PER_TASK", os.cpu_count() or 8)) // THREADS)
 
 # ===== Paths =====
 PROJECT_DIR = Path(__file__).resolve().parent
 MAIN        = PROJECT_DIR / "main_ortel.py"
 RESULTS_DIR = PROJECT_DIR / "results"
 LOGS_DIR    = PROJECT_DIR / "logs_runs"
+STORE_DIR   = RESULTS_DIR / "store"
+CAMP_DIR    = PROJECT_DIR / "campaigns" / CAMPAIGN
 for p in [RESULTS_DIR, LOGS_DIR]:
     p.mkdir(parents=True, exist_ok=True)
 
@@ -53,13 +96,15 @@ def py_exe() -> str:
     return sys.executable or "python"
 
 
-def job_cmd(n_per_z: int) -> list[str]:
+def job_args(n_per_z: int, seed: int, spawn_key: tuple[int, ...],
+             ckpt: Optional[Path] = None, deadline: Optional[float] = None) -> list[str]:
     """
-    Construye el comando que ejecuta main_ortel.py con parámetros fijos.
-    Aquí n_per_z es el nº de puntos por fibra.
+    Argumentos de main_ortel.py para una réplica, con los parámetros fijos.
+    Aquí n_per_z es el nº de puntos por fibra; (seed, spawn_key) identifican
+    el flujo aleatorio de la réplica; ckpt es su checkpoint y deadline el fin
+    de la corrida (time.time()).
     """
     return [
-        py_exe(), "-X", "utf8", str(MAIN),
         "--d", str(D),
         "--z_vals", *[str(z) for z in Z_VALS],
         "--n_per_z", str(n_per_z),
@@ -69,36 +114,127 @@ def job_cmd(n_per_z: int) -> list[str]:
         "--f_threshold", str(F_THRESH),
         "--target_mb", str(TARGET_MB),
         "--results_root", str(RESULTS_DIR),
+        "--threads", str(THREADS),
+        "--seed", str(seed),
+        "--spawn_key", *[str(k) for k in spawn_key],
+        *(["--min_hull"] if MIN_HULL else []),
+        *(["--store", str(STORE_DIR)] if USE_STORE else []),
+        *(["--checkpoint", str(ckpt), "--checkpoint_every", str(CKPT_EVERY)] if ckpt else []),
+        *(["--deadline", repr(deadline)] if deadline is not None else []),
     ]
 
 
-def run_one(n_per_z: int) -> tuple[bool, int, str]:
-    """Ejecuta una réplica individual y guarda sus logs."""
+def job_cmd(n_per_z: int, seed: int, spawn_key: tuple[int, ...],
+            ckpt: Optional[Path] = None) -> list[str]:
+    """Comando equivalente por línea de comandos (para repetir una réplica a mano)."""
+    return [py_exe(), "-X", "utf8", str(MAIN), *job_args(n_per_z, seed, spawn_key, ckpt)]
+
+
+_STORE = None
+
+
+def worker_store() -> Optional[ResultStore]:
+    """Almacén propio de este worker (archivos s<shard>_<host>_<pid>), abierto una vez."""
+    global _STORE
+    if USE_STORE and _STORE is None:
+        shard, _ = campaign.slurm_shard()
+        _STORE = ResultStore(STORE_DIR, writer=f"s{shard}_{default_writer()}")
+    return _STORE
+
+
+def run_one(n_per_z: int, seed: int, spawn_key: tuple[int, ...], ckpt: Optional[Path] = None,
+            deadline: Optional[float] = None):
+    """
+    Ejecuta una réplica dentro del worker (numpy/scipy ya importados) y devuelve
+    (status, n_per_z, rid, resultado), con status "ok" o "partial" (la búsqueda
+    se cortó en deadline; resultado es el dict de run_experiment), "err"
+    (resultado es el traceback) o "skipped" (deadline ya pasó; no se corrió).
+    Los errores van al log del almacén del worker (o a un .err en LOGS_DIR sin
+    almacén).
+    """
     rid = uuid.uuid4().hex[:8]
-    log_out = LOGS_DIR / f"run_np{n_per_z}_{rid}.out"
-    log_err = LOGS_DIR / f"run_np{n_per_z}_{rid}.err"
-
-    cmd = job_cmd(n_per_z)
-    proc = subprocess.run(
-        cmd,
-        cwd=PROJECT_DIR,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        encoding="utf-8",
-        errors="replace",
-    )
-
-    # Guardamos logs por réplica (útil para revisar errores)
-    log_out.write_text(proc.stdout or "", encoding="utf-8")
-    log_err.write_text(proc.stderr or "", encoding="utf-8")
-
-    ok = (proc.returncode == 0)
-    if not ok:
-        sys.stderr.write(f"[ERR] n_per_z={n_per_z} rid={rid} rc={proc.returncode}\n")
-        if proc.stderr:
-            sys.stderr.write(proc.stderr.strip()[:1500] + "\n")
-    return ok, n_per_z, rid
+    if deadline is not None and time.time() >= deadline:
+        return "skipped", n_per_z, rid, None
+    store = worker_store()
+    try:
+        argv = job_args(n_per_z, seed, spawn_key, ckpt, deadline)
+        res = run_experiment(build_parser().parse_args(argv), store=store)
+    except Exception:
+        tb = traceback.format_exc()
+        text = f"[{rid}] " + " ".join(job_cmd(n_per_z, seed, spawn_key, ckpt)) + "\n\n" + tb
+        if store is not None:
+            store.log(text)
+        else:
+            (LOGS_DIR / f"run_np{n_per_z}_{rid}.err").write_text(text, encoding="utf-8")
+        return "err", n_per_z, rid, tb
+    return ("partial" if res["timed_out"] else "ok"), n_per_z, rid, res
+
+
+def summarize(n_per_z: int, results: list[dict]) -> str:
+    """Resumen de un grupo n_per_z a partir de los resultados en memoria."""
+    if not results:
+        return f"n_per_z={n_per_z}: sin resultados"
+    F = np.array([r["F"] for r in results])
+    t = np.array([r["t_total"] for r in results])
+    n_hull = int(np.sum(F >= F_THRESH))
+    return (f"n_per_z={n_per_z}: F={F.mean():.4f}±{F.std():.4f} (min={F.min():.4f}) | "
+            f"hulls={n_hull}/{len(F)} | t={t.mean():.2f}s/réplica "
+            f"(p95={np.percentile(t, 95):.2f}s, max={t.max():.2f}s)\n"
+            + summarize_profile(results))
+
+
+def summarize_profile(results: list[dict]) -> str:
+    """
+    Promedio por réplica de los tiempos por etapa y de los contadores de
+    profiling (ver main_ortel.run_experiment), para ver dónde se va el tiempo.
+    """
+    profs = [r["profile"] for r in results if r.get("profile")]
+    if not profs:
+        return "    (sin perfil)"
+    stages = sorted({k for p in profs for k in p["times"]},
+                    key=lambda k: -sum(p["times"].get(k, 0.0) for p in profs))
+    lines = []
+    for k in stages:
+        ts = np.array([p["times"].get(k, 0.0) for p in profs])
+        calls = np.mean([p["calls"].get(k, 0) for p in profs])
+        lines.append(f"    {k:<22} {ts.mean():9.3f}s (max {ts.max():.3f}s, {calls:.0f} llamadas)")
+    counts = sorted({k for p in profs for k in (*p["counts"], *p["values"])})
+    for k in counts:
+        vs = np.array([p["counts"].get(k, p["values"].get(k, 0.0)) for p in profs], float)
+        lines.append(f"    {k:<22} {vs.mean():12.0f} (max {vs.max():.0f})")
+    return "\n".join(lines)
+
+
+def campaign_params() -> dict:
+    """Parámetros que definen la campaña (retomar exige que coincidan)."""
+    return {
+        "d": D, "z_vals": Z_VALS, "N": N, "N_cp": N_CP, "N_hip": N_HIP,
+        "f_threshold": F_THRESH, "target_mb": TARGET_MB,
+    }
+
+
+def preflight() -> Optional[str]:
+    """
+    Chequeo rápido antes de gastar la asignación: imports, una réplica mínima
+    con los mismos d y z_vals (en un directorio temporal) y permiso de escritura
+    en RESULTS_DIR (y su almacén). Devuelve None si todo está bien, o el error.
+    """
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            argv = [
+                "--d", str(D), "--z_vals", *[str(z) for z in Z_VALS],
+                "--n_per_z", str(min(POINTS_AND_REPS)), "--N", "2000",
+                "--N_cp", "2", "--N_hip", "8", "--results_root", tmp, "--seed", "0",
+            ]
+            res = run_experiment(build_parser().parse_args(argv))
+            if not np.isfinite(res["F"]):
+                return f"F no finito en la réplica de prueba: {res['F']}"
+        STORE_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=STORE_DIR if USE_STORE else RESULTS_DIR):
+            pass
+    except Exception:
+        return traceback.format_exc()
+    return None
 
 
 # ===== Main loop =====
@@ -107,30 +243,90 @@ def main() -> int:
         sys.stderr.write(f"[FATAL] No encuentro main_ortel.py en {MAIN}\n")
         return 2
 
-    print(f"=== Lanzando experimentos seedless con {NUM_WORKERS} workers ===")
-    print(f"Z={Z_VALS} | D={D} | N={N} | N_cp={N_CP} | N_hip={N_HIP} | thr={F_THRESH}")
-    print(f"POINTS_AND_REPS={POINTS_AND_REPS}")
+    err = preflight()
+    if err is not None:
+        sys.stderr.write(f"[FATAL] preflight falló; no se lanza nada\n{err}\n")
+        return 2
 
-    for n_per_z, reps in POINTS_AND_REPS.items():
-        print(f"\n>>> n_per_z={n_per_z} — {reps} réplicas")
-        ok_cnt = err_cnt = 0
+    deadline = None if WALLTIME is None else time.time() + WALLTIME
+    shard, n_shards = campaign.slurm_shard()
+    man = campaign.load_or_create(CAMP_DIR, campaign_params(), POINTS_AND_REPS, seed=SEED)
+    seed = man["seed"]
+    todo = campaign.pending(man, CAMP_DIR, shard, n_shards)
 
-        if reps <= 0:
-            print(f"[SKIP] n_per_z={n_per_z} sin réplicas")
-            continue
+    print(f"=== Lanzando experimentos con {NUM_WORKERS} workers (seed={seed}) ===")
+    print(f"Z={Z_VALS} | D={D} | N={N} | N_cp={N_CP} | N_hip={N_HIP} | thr={F_THRESH}")
+    print(f"campaña={CAMP_DIR} | shard {shard}/{n_shards} | "
+          f"pendientes={len(todo)} de {len(man['replicas'])}")
 
-        # Pool de procesos paralelos
-        with ProcessPoolExecutor(max_workers=NUM_WORKERS) as ex:
-            futs = [ex.submit(run_one, n_per_z) for _ in range(reps)]
-            for i, fut in enumerate(as_completed(futs), 1):
-                ok, npz, rid = fut.result()
-                ok_cnt += int(ok)
-                err_cnt += int(not ok)
-                if (i % 10 == 0) or (not ok):
-                    print(f"[PROG] n_per_z={n_per_z}: {i}/{reps} (ok={ok_cnt}, err={err_cnt})")
+    # Un solo pool para toda la corrida: los workers conservan sus imports y
+    # toman réplicas de todos los grupos, sin esperar a que termine cada n_per_z
+    pending = defaultdict(int)
+    for r in todo:
+        pending[r["n_per_z"]] += 1
+    done = defaultdict(int)
+    errors = defaultdict(int)
+    results = defaultdict(list)
+    unfinished = 0
+    consec = 0
+    aborted = False
+    ckpt_dir = CAMP_DIR / "ckpt"
+    with ProcessPoolExecutor(max_workers=NUM_WORKERS) as ex:
+        futs = {
+            ex.submit(run_one, r["n_per_z"], seed, (r["n_per_z"], r["r"]),
+                      ckpt_dir / f"{r['id']}.json", deadline): r
+            for r in todo
+        }
+        for fut in as_completed(futs):
+            rep = futs[fut]
+            status, n_per_z, rid, res = fut.result()
+            done[n_per_z] += 1
+            reps = pending[n_per_z]
+            ok = status in ("ok", "partial")
+            if status == "skipped":
+                unfinished += 1
+                continue
+            record = {"id": rep["id"], "n_per_z": n_per_z, "r": rep["r"], "rid": rid,
+                      "status": status, "time": time.time()}
+            if ok:
+                consec = 0
+                record.update(F=res["F"], subdir=res["subdir"], result_path=res["result_path"],
+                              t_total=res["t_total"], profile=res["profile"])
+                if status == "ok":
+                    results[n_per_z].append(res)
+                else:
+                    unfinished += 1
+                    record["n_cand_done"] = res["stats"]["n_cand_done"]
+            else:
+                consec += 1
+                errors[n_per_z] += 1
+                record["error"] = res.strip().splitlines()[-1] if res.strip() else ""
+                sys.stderr.write(f"[ERR] n_per_z={n_per_z} rid={rid}\n{res.strip()[-1500:]}\n")
+            campaign.append_status(CAMP_DIR, shard, record)
 
-        print(f"[DONE] n_per_z={n_per_z}: ok={ok_cnt}, err={err_cnt}")
+            i = done[n_per_z]
+            if (i % 10 == 0) or (not ok):
+                print(f"[PROG] n_per_z={n_per_z}: {i}/{reps} "
+                      f"(ok={len(results[n_per_z])}, err={errors[n_per_z]})")
+            if i == reps:
+                print(f"[DONE] n_per_z={n_per_z}: ok={len(results[n_per_z])}, "
+                      f"err={errors[n_per_z]}")
+            if consec >= MAX_CONSEC_FAILS:
+                sys.stderr.write(f"[FATAL] {consec} réplicas seguidas fallaron; "
+                                 f"se cancelan las pendientes\n")
+                ex.shutdown(wait=False, cancel_futures=True)
+                aborted = True
+                break
 
+    print("\n=== RESUMEN ===")
+    for n_per_z in sorted(pending):
+        print(summarize(n_per_z, results[n_per_z]))
+    if aborted:
+        return 3
+    if unfinished:
+        print(f"\n=== {unfinished} réplicas sin terminar por ORTEL_WALLTIME: "
+              f"relanza para retomarlas ===")
+        return 4
     print("\n=== TODO COMPLETADO ===")
     return 0
 
@@ -1,4 +1,11 @@
-def rejection_sampling(d, A, b, z, N, tol=1e-9, batch=None, target_mb=None):
+import numpy as np
+
+from samplers import make_sampler
+from vol_star import MembershipKernel, _resolve_batch
+
+
+def rejection_sampling(d, A, b, z, N, tol=1e-9, batch=None, target_mb=None, sampler="mc",
+                       dtype=np.float64, rng=None):
     """
     Estima Vol_rel(S_z) = P[(z,p) ∈ C] con p ~ U([0,1]^d), i.e.,
     volumen relativo en la fibra z dentro de [0,1]^d.
@@ -12,6 +19,9 @@ def rejection_sampling(d, A, b, z, N, tol=1e-9, batch=None, target_mb=None):
     tol       : float                tolerancia numérica para Ax ≤ b + tol
     batch     : int/None             tamaño de lote; si None, se calcula automático
     target_mb : float/None           memoria objetivo para calcular el batch
+    sampler   : str                  "mc", "sobol" o "halton" (ver samplers.py)
+    dtype     : np.float64/float32   precisión del test de pertenencia (vol_star.MembershipKernel)
+    rng       : Generator/semilla    fuente de aleatoriedad (samplers.make_rng)
 
     Retorna
     -------
@@ -35,15 +45,12 @@ def rejection_sampling(d, A, b, z, N, tol=1e-9, batch=None, target_mb=None):
     b_shift = b - A[:, 0] * z_val  # (#ineq,)
     n_ineq = A.shape[0]
 
-    # Elegir tamaño de lote
-    if batch is None:
-        m_auto = _choose_batch(n_ineq, target_mb=target_mb)
-        batch = min(N, max(1000, m_auto))  # al menos 1000, sin pasar de N
-    else:
-        batch = int(batch)
-        if batch <= 0:
-            batch = min(N, max(1000, _choose_batch(n_ineq, target_mb=target_mb)))
+    # Elegir tamaño de lote (al menos 1000, sin pasar de N, salvo que se dé batch)
+    batch = _resolve_batch(N, n_ineq, batch=batch, target_mb=target_mb)
 
+    # Buffers del test de pertenencia, reutilizados en cada lote
+    kern = MembershipKernel(Ap, b_shift, batch, tol=tol, dtype=dtype, rng=rng)
+    draw = None if sampler == "mc" else make_sampler(sampler, d, rng=kern.rng)
     aceptados = 0
     generados = 0
 
@@ -51,14 +58,10 @@ def rejection_sampling(d, A, b, z, N, tol=1e-9, batch=None, target_mb=None):
     while generados < N:
         m = min(batch, N - generados)
 
-        # Puntos aleatorios en [0,1]^d
-        p_samples = np.random.rand(m, d)   # (m, d)
-        lhs = p_samples @ Ap.T             # (m, #ineq)
-
-        # Chequeo de pertenencia al poliedro
-        inside = np.all(lhs <= (b_shift + tol), axis=1)
+        # Puntos aleatorios (o cuasi-aleatorios) en [0,1]^d y chequeo de pertenencia
+        _, inside = kern.sample(m, draw)
 
-        aceptados += int(inside.sum())
+        aceptados += int(np.count_nonzero(inside))
         generados += m
 
     return aceptados / float(N)
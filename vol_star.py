@@ -1,6 +1,25 @@
 # vol_star.py
+import threading
+
 import numpy as np
 
+import profiling
+from fibers import FiberPolytope, FiberTriangulation, fiber_bbox, fiber_vertices
+from poly2d import fiber_polygon, polygon_area, split_areas, worst_cut_sweep
+from samplers import SAMPLERS, make_rng, make_sampler
+
+
+# Con cota incumbente, las direcciones se evalúan en bloques de este tamaño para
+# poder cortar apenas el mínimo cae bajo la cota.
+_PRUNE_BLOCK = 64
+
+# Cuantil normal para semianchos de intervalos de confianza al 95 %
+_Z95 = 1.96
+
+# Samplers QMC aleatorizados: su error estándar sale de repeticiones con
+# scrambles independientes, no de la fórmula binomial (ver FiberGeometry)
+_QMC = ("sobol", "halton")
+
 
 def _choose_batch(n_ineq, target_mb=None):
     """Tamaño de lote automático dado #inequaciones y una meta de memoria (MiB)."""
@@ -12,14 +31,137 @@ def _choose_batch(n_ineq, target_mb=None):
     return int(m)
 
 
-def _fiber_vol_est(d, A, b, z, N, tol=1e-9, batch=None, target_mb=None):
+def _resolve_batch(N, n_ineq, batch=None, target_mb=None):
+    """Lote efectivo: el dado por el usuario, o uno automático entre 1000 y N."""
+    if batch is not None and int(batch) > 0:
+        return int(batch)
+    return min(int(N), max(1000, _choose_batch(n_ineq, target_mb=target_mb)))
+
+
+class MembershipKernel:
+    """
+    Test de pertenencia p ∈ S_z = {p : Ap p <= b_shift + tol} con buffers
+    preasignados, para el bucle interno de todos los estimadores.
+
+    Los buffers (muestras, Ap p, comparaciones, máscara) se crean una vez por
+    (batch, #ineq) y se reutilizan en cada lote: las muestras "mc" se generan en
+    su lugar con Generator.random(out=...), y el producto y las comparaciones
+    usan out=. b_shift + tol se calcula una sola vez. Ap p se guarda transpuesto,
+    (#ineq, m), para que la reducción "todas las desigualdades" recorra filas
+    contiguas en vez de hacer np.all(axis=1) sobre filas cortas.
+
+    Con dtype=np.float32 el producto y la comparación se hacen en float32 y las
+    filas que quedan a menos del margen de redondeo de alguna cara se
+    recomprueban en float64, así que el resultado es el mismo que en float64
+    (para los puntos float32 generados).
+
+    Las muestras "mc" salen de rng (numpy.random.Generator; ver samplers.make_rng).
+    Las vistas que devuelve sample() se sobrescriben en la llamada siguiente.
+
+    sample() suma las muestras generadas y aceptadas a los contadores
+    samples_drawn.<label> / samples_accepted.<label> de profiling (label: la
+    fibra, p. ej. "z0").
+    """
+
+    def __init__(self, Ap, b_shift, batch, tol=1e-9, dtype=np.float64, box=None, rng=None,
+                 label=None):
+        Ap = np.asarray(Ap, float)
+        b_shift = np.asarray(b_shift, float)
+        n_ineq, d = Ap.shape
+        self.d = d
+        self.batch = max(1, int(batch))
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError(f"dtype debe ser float32 o float64 (dtype={self.dtype}).")
+        self.rng = make_rng(rng)
+        self._n_drawn = f"samples_drawn.{label}" if label is not None else "samples_drawn"
+        self._n_accepted = f"samples_accepted.{label}" if label is not None else "samples_accepted"
+
+        self._Ap64 = np.ascontiguousarray(Ap)
+        self._bt64 = b_shift + tol
+        self._Ap = self._Ap64.astype(self.dtype)
+        self._bt = self._bt64.astype(self.dtype)[:, None]
+
+        self._lo, self._w = (None, None) if box is None else _box_params(box)[:2]
+
+        self._p = np.empty((self.batch, d), dtype=self.dtype)
+        self._lhs = np.empty((n_ineq, self.batch), dtype=self.dtype)
+        self._mask = np.empty((n_ineq, self.batch), dtype=bool)
+        self._inside = np.empty(self.batch, dtype=bool)
+
+        self._f32 = self.dtype == np.float32
+        if self._f32:
+            # error de redondeo de Ap p - b en float32 con p ∈ [0,1]^d
+            eps = float(np.finfo(np.float32).eps)
+            margin = 4.0 * (d + 1) * eps * (np.abs(Ap).sum(axis=1) + np.abs(self._bt64))
+            self._bt_lo = (self._bt64 - margin).astype(np.float32)[:, None]
+            self._bt_hi = (self._bt64 + margin).astype(np.float32)[:, None]
+            self._amb = np.empty(self.batch, dtype=bool)
+
+    def sample(self, m, draw=None, rng=None):
+        """
+        Genera m <= batch puntos (con draw(m) si se da, si no U([0,1)^d) de rng o,
+        si es None, de self.rng), los lleva a la caja si hay, y devuelve
+        (p, inside) como vistas de largo m.
+        """
+        p = self._p[:m]
+        if draw is None:
+            (self.rng if rng is None else rng).random(out=p, dtype=self.dtype)
+        else:
+            p[...] = draw(m)
+        if self._lo is not None:
+            p *= self._w
+            p += self._lo
+        inside = self.test(m)
+        profiling.count(self._n_drawn, m)
+        profiling.count(self._n_accepted, np.count_nonzero(inside))
+        return p, inside
+
+    def test(self, m):
+        """Máscara de pertenencia de las m primeras filas del buffer de muestras."""
+        p = self._p[:m]
+        lhs = self._lhs[:, :m]
+        mask = self._mask[:, :m]
+        inside = self._inside[:m]
+
+        np.matmul(self._Ap, p.T, out=lhs)                   # (#ineq, m)
+        if not self._f32:
+            np.less_equal(lhs, self._bt, out=mask)
+            np.logical_and.reduce(mask, axis=0, out=inside)
+            return inside
+
+        # float32: seguro adentro (con margen) / seguro afuera / ambiguo
+        amb = self._amb[:m]
+        np.less_equal(lhs, self._bt_hi, out=mask)
+        np.logical_and.reduce(mask, axis=0, out=amb)
+        np.less_equal(lhs, self._bt_lo, out=mask)
+        np.logical_and.reduce(mask, axis=0, out=inside)
+        amb &= ~inside
+        if amb.any():
+            idx = np.flatnonzero(amb)
+            p64 = p[idx].astype(np.float64)
+            inside[idx] = np.all(p64 @ self._Ap64.T <= self._bt64, axis=1)
+        return inside
+
+
+@profiling.timed("_fiber_vol_est")
+def _fiber_vol_est(d, A, b, z, N, tol=1e-9, batch=None, target_mb=None, sampler="mc",
+                   bbox=False, dtype=np.float64, rng=None):
     """
     Estima Vol_rel(S_z) = P[(z,p) ∈ C] con p ~ U([0,1]^d), i.e., volumen relativo en la fibra z.
+    sampler elige la secuencia de puntos ("mc", "sobol", "halton"; ver samplers.py).
+    Con sampler="direct" no se muestrea: se devuelve el volumen exacto de la
+    triangulación de S_z (fibers.FiberTriangulation); si la triangulación no se
+    pudo calcular, se estima con "mc".
+    Con bbox=True se muestrea solo dentro de la caja de S_z (fibers.fiber_bbox)
+    y la proporción aceptada se reescala por el volumen de la caja.
+    dtype=np.float32 usa el test de pertenencia en float32 (ver MembershipKernel).
+    rng: numpy.random.Generator, semilla o None (ver samplers.make_rng).
     Devuelve un número en [0,1].
     """
     d = int(d)
     N = int(N)
-    if N <= 0 or d <= 0:
+    if d <= 0 or (N <= 0 and sampler != "direct"):
         return 0.0
 
     A = np.asarray(A, float)
@@ -27,34 +169,491 @@ def _fiber_vol_est(d, A, b, z, N, tol=1e-9, batch=None, target_mb=None):
     if A.shape[1] != 1 + d:
         raise ValueError(f"A tiene {A.shape[1]} columnas; d={d} ⇒ 1+d={1+d}.")
 
+    if sampler == "direct":
+        tri = FiberTriangulation(fiber_vertices(A, b, z, d, tol=tol), d=d)
+        if tri.valid:
+            return tri.volume
+        sampler = "mc"
+
     z_val = float(int(z))
 
     Ap = A[:, 1:]                  # (#ineq, d)
     b_shift = b - A[:, 0] * z_val  # (#ineq,)
-    n_ineq = A.shape[0]
+    batch = _resolve_batch(N, A.shape[0], batch=batch, target_mb=target_mb)
 
-    if batch is None:
-        m_auto = _choose_batch(n_ineq, target_mb=target_mb)
-        batch = min(N, max(1000, m_auto))
-    else:
-        batch = int(batch)
-        if batch <= 0:
-            batch = min(N, max(1000, _choose_batch(n_ineq, target_mb=target_mb)))
+    box, box_vol = None, 1.0
+    if bbox:
+        box = fiber_bbox(A, b, z, d, tol=tol)
+        if box is None:
+            return 0.0
+        box_vol = _box_params(box)[2]
+        if box_vol <= 0:
+            return 0.0
 
+    kern = MembershipKernel(Ap, b_shift, batch, tol=tol, dtype=dtype, box=box, rng=rng,
+                            label=f"z{int(z)}")
+    draw = None if sampler == "mc" else make_sampler(sampler, d, rng=kern.rng)
     aceptados = 0
     gen = 0
     while gen < N:
         m = min(batch, N - gen)
-        p = np.random.rand(m, d)               # (m, d)
-        lhs = p @ Ap.T                         # (m, #ineq)
-        inside = np.all(lhs <= (b_shift + tol), axis=1)
-        aceptados += int(inside.sum())
+        _, inside = kern.sample(m, draw)       # (m, d), (m,)
+        aceptados += int(np.count_nonzero(inside))
         gen += m
 
-    return aceptados / float(N)
+    return box_vol * aceptados / float(N)
 
 
-def ratio_cp(A, b, cp, z_vals, N_hip, d, N, tol=1e-9, batch=None, target_mb=None):
+def _box_params(box):
+    """(lo, ancho, volumen) de una caja (lo, hi)."""
+    lo, hi = box
+    w = np.maximum(hi - lo, 0.0)
+    return lo, w, float(np.prod(w))
+
+
+def _fiber_vol_rqmc(d, A, b, z, N, n_rep=8, tol=1e-9, batch=None, target_mb=None,
+                    sampler="sobol", bbox=False, dtype=np.float64, rng=None):
+    """
+    Vol_rel(S_z) con n_rep repeticiones independientes (scrambles distintos) de
+    N // n_rep puntos cada una.
+
+    Devuelve (media, error estándar de la media).
+    """
+    n_rep = max(2, int(n_rep))
+    n_each = max(1, int(N) // n_rep)
+    rng = make_rng(rng)
+    est = np.array([
+        _fiber_vol_est(d, A, b, z, n_each, tol=tol, batch=batch, target_mb=target_mb,
+                       sampler=sampler, bbox=bbox, dtype=dtype, rng=rng)
+        for _ in range(n_rep)
+    ])
+    return float(est.mean()), float(est.std(ddof=1) / np.sqrt(n_rep))
+
+
+def _fiber_vol_seq(d, A, b, z, hw, N_max, N0=None, tol=1e-9, batch=None, target_mb=None,
+                   sampler="mc", bbox=False, n_rep=8, dtype=np.float64, rng=None):
+    """
+    Vol_rel(S_z) secuencial: se duplican las muestras (desde N0) hasta que el
+    semiancho del IC 95 % sea <= hw o se llegue a N_max.
+
+    Con "mc" el error estándar es binomial; con "sobol" / "halton" las muestras
+    se reparten en n_rep scrambles independientes y el error estándar es el de
+    la media de sus n_rep estimaciones (la fórmula binomial lo sobrestima).
+
+    Devuelve (estimación, error estándar, muestras usadas).
+    """
+    d = int(d)
+    N_max = int(N_max)
+    A = np.asarray(A, float)
+    b = np.asarray(b, float)
+    if A.shape[1] != 1 + d:
+        raise ValueError(f"A tiene {A.shape[1]} columnas; d={d} ⇒ 1+d={1+d}.")
+
+    box, box_vol = None, 1.0
+    if bbox:
+        box = fiber_bbox(A, b, z, d, tol=tol)
+        if box is None or _box_params(box)[2] <= 0:
+            return 0.0, 0.0, 0
+        box_vol = _box_params(box)[2]
+
+    Ap = A[:, 1:]
+    b_shift = b - A[:, 0] * float(int(z))
+    batch = _resolve_batch(N_max, A.shape[0], batch=batch, target_mb=target_mb)
+    step = int(N0) if N0 else batch
+
+    kern = MembershipKernel(Ap, b_shift, min(batch, N_max), tol=tol, dtype=dtype, box=box,
+                            rng=rng, label=f"z{int(z)}")
+    R = max(2, int(n_rep)) if sampler in _QMC else 1
+    draws = [None if sampler == "mc" else make_sampler(sampler, d, rng=kern.rng)
+             for _ in range(R)]
+    acc = np.zeros(R, dtype=np.int64)
+    n_r = np.zeros(R, dtype=np.int64)
+    n = 0
+    se = 0.0
+    while n < N_max:
+        target = min(n + step, N_max)
+        goal = np.full(R, target // R, dtype=np.int64)
+        goal[:target % R] += 1
+        for r in range(R):
+            while n_r[r] < goal[r]:
+                m = min(kern.batch, int(goal[r] - n_r[r]))
+                _, inside = kern.sample(m, draws[r])
+                acc[r] += int(np.count_nonzero(inside))
+                n_r[r] += m
+        n = int(n_r.sum())
+        if R > 1 and acc.any():
+            se = box_vol * float(np.std(acc / np.maximum(n_r, 1), ddof=1) / np.sqrt(R))
+        else:
+            # sin aceptados la dispersión entre scrambles es 0: cota binomial
+            se = box_vol * _binom_se(int(acc.sum()), n)
+        if _Z95 * se <= hw:
+            break
+        step = n  # duplicar
+
+    if n == 0:
+        return 0.0, 0.0, 0
+    return box_vol * int(acc.sum()) / float(n), float(se), int(n)
+
+
+def _binom_se(k, n):
+    """Error estándar de k/n; p se ajusta a (k+1)/(n+2) para no dar 0 en los extremos."""
+    if n <= 0:
+        return 0.0
+    p = (k + 1.0) / (n + 2.0)
+    return float(np.sqrt(p * (1.0 - p) / n))
+
+
+def _accepted_pool(d, Ap, b_shift, N, tol=1e-9, batch=1000, sampler="mc", box=None,
+                   dtype=np.float64, kern=None, draw=None, rng=None):
+    """
+    Muestrea N puntos p ~ U([0,1]^d) (o ~ U(caja) si box=(lo, hi)) y conserva
+    solo los que caen en S_z. Si se da kern (MembershipKernel ya construido
+    para esta fibra y caja), se reutilizan sus buffers y su rng. Si se da draw
+    (make_sampler), se continúa esa secuencia en vez de empezar una nueva.
+
+    Devuelve (pts, n_gen): los puntos aceptados, shape (k, d), y el número de
+    muestras generadas. Vol_rel(S_z) ≈ vol(caja) · k / n_gen y, para cualquier
+    semiespacio H, Vol_rel(S_z ∩ H) ≈ vol(caja) · #{pts ∈ H} / n_gen.
+    """
+    if kern is None:
+        kern = MembershipKernel(Ap, b_shift, min(batch, max(int(N), 1)), tol=tol, dtype=dtype,
+                                box=box, rng=rng)
+    if draw is None and sampler != "mc":
+        draw = make_sampler(sampler, d, rng=kern.rng)
+    bloques = []
+    gen = 0
+    while gen < N:
+        m = min(kern.batch, N - gen)
+        p, inside = kern.sample(m, draw)
+        if inside.any():
+            bloques.append(p[inside].astype(float))
+        gen += m
+
+    if bloques:
+        pts = np.vstack(bloques)
+    else:
+        pts = np.empty((0, d), dtype=float)
+    return pts, gen
+
+
+class FiberGeometry:
+    """
+    Todo lo que ratio_cp necesita por fibra y que no depende de cp:
+
+        - Ap y b_shift(z) = b - a0·z,
+        - el tamaño de lote,
+        - Vol_rel(S_z), el denominador de F,
+        - los puntos aceptados de cada fibra (method="pool"),
+        - los polígonos (d = 2), los politopos con sus vértices y aristas
+          (method="exact", d != 2) y las triangulaciones (sampler="direct"),
+        - las cajas alineadas a los ejes de cada fibra (bbox=True),
+        - un MembershipKernel por fibra (buffers del test de pertenencia).
+
+    Con hw (semiancho objetivo del IC 95 %) y N_max, los volúmenes se estiman
+    secuencialmente y ratio_cp(method="pool") hace crecer los pools (extend)
+    hasta alcanzar esa precisión en F(cp) o llegar a N_max muestras por fibra.
+
+    Con sampler "sobol" o "halton", las N muestras de cada fibra se reparten en
+    n_rep scrambles independientes (cada uno continúa su secuencia al crecer
+    el pool) y cada punto del pool recuerda de qué scramble salió; los
+    volúmenes sin pool se estiman con _fiber_vol_rqmc. Así los errores
+    estándar salen de la dispersión entre repeticiones.
+
+    ortel() la construye una vez por politopo y la pasa a cada ratio_cp; así los
+    N_cp candidatos comparten volúmenes y muestras. Cada pieza se calcula la
+    primera vez que se pide y queda en caché. Todas las muestras salen de
+    self.rng (numpy.random.Generator, ver samplers.make_rng).
+
+    Se puede compartir entre hilos: las cachés se llenan bajo un lock y cada
+    hilo tiene sus propios MembershipKernel (buffers). prepare(method) llena de
+    antemano lo que necesita ratio_cp, para que los hilos solo lean.
+    """
+
+    def __init__(self, A, b, d, z_vals, N, tol=1e-9, batch=None, target_mb=None, sampler="mc",
+                 bbox=False, hw=None, N_max=None, n_rep=8, dtype=np.float64, rng=None):
+        A = np.asarray(A, float)
+        b = np.asarray(b, float)
+        d = int(d)
+        if A.shape[1] != 1 + d:
+            raise ValueError(f"A tiene {A.shape[1]} columnas; d={d} ⇒ 1+d={1+d}.")
+
+        self.A = A
+        self.b = b
+        self.d = d
+        self.z_vals = [int(z) for z in z_vals]
+        self.N = int(N)
+        self.tol = tol
+        self.target_mb = target_mb
+        self.sampler = sampler
+        self.bbox = bool(bbox)
+        self.hw = None if hw is None else float(hw)
+        self.N_max = self.N if N_max is None else max(self.N, int(N_max))
+        self.n_rep = max(2, int(n_rep))
+        self.dtype = np.dtype(dtype)
+        self.rng = make_rng(rng)
+
+        self.Ap = A[:, 1:]                  # (#ineq, d)
+        self.batch = _resolve_batch(self.N, A.shape[0], batch=batch, target_mb=target_mb)
+
+        self._shift = {}
+        self._vols = {}
+        self._vol_se = {}
+        self._pools = {}
+        self._pool_n = {}
+        self._pool_reps = {}
+        self._draws = {}
+        self._polys = {}
+        self._polytopes = {}
+        self._tris = {}
+        self._boxes = {}
+        self._local = threading.local()
+        self._lock = threading.RLock()
+
+    def shift(self, z):
+        """b - a0·z, lado derecho de la fibra z."""
+        z = int(z)
+        if z not in self._shift:
+            self._shift[z] = self.b - self.A[:, 0] * float(z)
+        return self._shift[z]
+
+    def box(self, z):
+        """
+        (lo, hi, vol) de la caja de S_z; la caja es [0,1]^d si bbox=False.
+        vol = 0 si la fibra es vacía.
+        """
+        z = int(z)
+        with self._lock:
+            if z in self._boxes:
+                return self._boxes[z]
+            if self.bbox:
+                box = fiber_bbox(self.A, self.b, z, self.d, tol=self.tol)
+                if box is None:
+                    box = (np.zeros(self.d), np.zeros(self.d))
+            else:
+                box = (np.zeros(self.d), np.ones(self.d))
+            self._boxes[z] = (box[0], box[1], _box_params(box)[2])
+            return self._boxes[z]
+
+    def kernel(self, z):
+        """MembershipKernel de la fibra z (restringido a su caja si bbox=True), uno por hilo."""
+        z = int(z)
+        kerns = self._local.__dict__.setdefault("kerns", {})
+        if z not in kerns:
+            box = self.box(z)[:2] if self.bbox else None
+            kerns[z] = MembershipKernel(self.Ap, self.shift(z), self.batch, tol=self.tol,
+                                        dtype=self.dtype, box=box, rng=self.rng,
+                                        label=f"z{z}")
+        return kerns[z]
+
+    def triangulation(self, z):
+        z = int(z)
+        with self._lock:
+            if z not in self._tris:
+                verts = fiber_vertices(self.A, self.b, z, self.d, tol=self.tol)
+                self._tris[z] = FiberTriangulation(verts, d=self.d)
+            return self._tris[z]
+
+    def polygon(self, z):
+        """(P, área) del polígono S_z; solo d = 2."""
+        z = int(z)
+        with self._lock:
+            if z not in self._polys:
+                P = fiber_polygon(self.A, self.b, z, tol=self.tol)
+                self._polys[z] = (P, polygon_area(P))
+            return self._polys[z]
+
+    def polytope(self, z):
+        """
+        FiberPolytope de S_z (vértices por HalfspaceIntersection); para d != 2.
+        Si Qhull no pudo con la fibra queda con valid=False.
+        """
+        z = int(z)
+        with self._lock:
+            if z not in self._polytopes:
+                verts = fiber_vertices(self.A, self.b, z, self.d, tol=self.tol)
+                self._polytopes[z] = FiberPolytope(verts, d=self.d)
+            return self._polytopes[z]
+
+    def prepare(self, method="pool"):
+        """
+        Calcula de una vez, para todas las fibras, lo que ratio_cp(method) lee de
+        geom: pools ("pool"), polígonos ("exact" en d = 2, "sweep"), politopos
+        ("exact" en d != 2) o volúmenes y cajas ("indep"). Después de esto,
+        evaluar candidatos en paralelo no escribe en las cachés (salvo extend
+        con hw).
+        """
+        if method == "exact" and self.d != 2:
+            if all(self.polytope(z).valid for z in self.z_vals):
+                return
+            method = "pool"     # _ratio_cp_exact cae a "pool" (ver ahí)
+        for z in self.z_vals:
+            if method == "pool":
+                self.pool(z)
+            elif method in ("exact", "sweep"):
+                self.polygon(z)
+            else:
+                self.box(z)
+                self.vol(z)
+
+    def _draw(self, z, n):
+        """
+        (pts, n_gen, escala, reps): n muestras nuevas de S_z; Vol ≈ escala · len(pts) / n_gen.
+        Con sampler="direct", una fibra sin triangulación se muestrea por rechazo ("mc").
+        Con sampler QMC, reps = (scramble de cada punto, muestras por scramble);
+        si no, reps = None.
+        """
+        z = int(z)
+        sampler = self.sampler
+        if sampler == "direct":
+            tri = self.triangulation(z)
+            if tri.valid:
+                pts = tri.sample(n, rng=self.rng)
+                profiling.count(f"samples_drawn.z{z}", pts.shape[0])
+                profiling.count(f"samples_accepted.z{z}", pts.shape[0])
+                return pts, pts.shape[0], tri.volume, None
+            sampler = "mc"
+        lo, hi, box_vol = self.box(z)
+        if sampler not in _QMC:
+            if box_vol <= 0:
+                return np.empty((0, self.d), dtype=float), n, 0.0, None
+            pts, n_gen = _accepted_pool(self.d, self.Ap, self.shift(z), n, sampler=sampler,
+                                        kern=self.kernel(z))
+            return pts, n_gen, box_vol, None
+
+        R = self.n_rep
+        n_r = np.full(R, n // R, dtype=np.int64)
+        n_r[:n % R] += 1
+        if box_vol <= 0:
+            return np.empty((0, self.d), dtype=float), n, 0.0, (np.empty(0, np.int64), n_r)
+        if z not in self._draws:
+            self._draws[z] = [make_sampler(sampler, self.d, rng=self.rng) for _ in range(R)]
+        bloques, labels = [], []
+        for r in range(R):
+            pts, n_r[r] = _accepted_pool(self.d, self.Ap, self.shift(z), int(n_r[r]),
+                                         kern=self.kernel(z), draw=self._draws[z][r])
+            bloques.append(pts)
+            labels.append(np.full(pts.shape[0], r, dtype=np.int64))
+        return np.vstack(bloques), int(n_r.sum()), box_vol, (np.concatenate(labels), n_r)
+
+    def pool(self, z):
+        """
+        (pts, w): puntos de S_z compartidos por todas las direcciones y todos los
+        cp, y el volumen relativo que representa cada uno.
+        """
+        z = int(z)
+        with self._lock:
+            if z not in self._pools:
+                pts, n_gen, scale, reps = self._draw(z, self.N)
+                self._pools[z] = (pts, scale / float(max(n_gen, 1)))
+                self._pool_n[z] = n_gen
+                if reps is not None:
+                    self._pool_reps[z] = reps
+            return self._pools[z]
+
+    def pool_counts(self, z):
+        """(n_gen, escala) del pool de z, para errores estándar: w = escala / n_gen."""
+        with self._lock:
+            pts, w = self.pool(z)
+            n_gen = self._pool_n[int(z)]
+        return n_gen, w * max(n_gen, 1)
+
+    def pool_reps(self, z):
+        """
+        (labels, n_r) del pool de z con sampler QMC: el scramble de cada punto
+        (en el orden de pool(z)[0]) y las muestras generadas por scramble.
+        None con "mc" o "direct".
+        """
+        with self._lock:
+            self.pool(z)
+            return self._pool_reps.get(int(z))
+
+    def extend(self, N_new):
+        """
+        Agranda a N_new muestras por fibra todos los pools ya construidos (las
+        muestras previas se conservan) y descarta los volúmenes en caché.
+        """
+        N_new = int(N_new)
+        with self._lock:
+            self._extend(N_new)
+
+    def _extend(self, N_new):
+        if N_new <= self.N:
+            return
+        for z in list(self._pools):
+            pts, w = self._pools[z]
+            n_old = self._pool_n[z]
+            scale = w * max(n_old, 1)
+            extra, n_gen, _, reps = self._draw(z, N_new - self.N)
+            pts = np.vstack([pts, extra])
+            n_tot = n_old + n_gen
+            self._pools[z] = (pts, scale / float(max(n_tot, 1)))
+            self._pool_n[z] = n_tot
+            if reps is not None:
+                labels, n_r = self._pool_reps[z]
+                self._pool_reps[z] = (np.concatenate([labels, reps[0]]), n_r + reps[1])
+        self.N = N_new
+        self._vols.clear()
+        self._vol_se.clear()
+
+    def vol(self, z):
+        """
+        Vol_rel(S_z): del pool si ya existe; si no, una estimación con N muestras
+        (secuencial hasta hw / N_max si se fijó hw; en n_rep scrambles con
+        sampler QMC).
+        """
+        z = int(z)
+        with self._lock:
+            if z not in self._vols:
+                se = np.nan
+                # "direct" sin triangulación (ver fibers.fiber_vertices): por rechazo
+                sampler = "mc" if self.sampler == "direct" else self.sampler
+                if z in self._pools:
+                    pts, w = self._pools[z]
+                    v = pts.shape[0] * w
+                elif self.sampler == "direct" and self.triangulation(z).valid:
+                    v, se = self.triangulation(z).volume, 0.0
+                elif self.hw is not None:
+                    v, se, _ = _fiber_vol_seq(self.d, self.A, self.b, z, self.hw, self.N_max,
+                                              N0=self.N, tol=self.tol, batch=self.batch,
+                                              sampler=sampler, bbox=self.bbox, n_rep=self.n_rep,
+                                              dtype=self.dtype, rng=self.rng)
+                elif sampler in _QMC:
+                    v, se = _fiber_vol_rqmc(self.d, self.A, self.b, z, self.N, n_rep=self.n_rep,
+                                            tol=self.tol, batch=self.batch, sampler=sampler,
+                                            bbox=self.bbox, dtype=self.dtype, rng=self.rng)
+                else:
+                    v = _fiber_vol_est(self.d, self.A, self.b, z, self.N, tol=self.tol,
+                                       batch=self.batch, sampler=sampler, bbox=self.bbox,
+                                       dtype=self.dtype, rng=self.rng)
+                self._vols[z] = v
+                self._vol_se[z] = se
+            return self._vols[z]
+
+
+def check_method(d, method, sampler):
+    """
+    ValueError si (d, method, sampler) no es una combinación válida de ratio_cp.
+    ortel y main_ortel la llaman antes de construir nada.
+    """
+    if method not in ("indep", "pool", "exact", "sweep"):
+        raise ValueError(
+            f"method desconocido: {method!r} (usa 'indep', 'pool', 'exact' o 'sweep')."
+        )
+    if sampler not in SAMPLERS + ("direct",):
+        raise ValueError(f"sampler desconocido: {sampler!r} (usa uno de {SAMPLERS + ('direct',)}).")
+    if method == "sweep" and d != 2:
+        raise ValueError(f"method='sweep' solo está implementado para d=2 (d={d}).")
+    if method == "exact" and d < 2:
+        raise ValueError(f"method='exact' necesita d >= 2 (d={d}).")
+    if sampler == "direct" and method != "pool":
+        raise ValueError("sampler='direct' solo se puede usar con method='pool'.")
+
+
+@profiling.timed("ratio_cp")
+def ratio_cp(A, b, cp, z_vals, N_hip, d, N, tol=1e-9, batch=None, target_mb=None,
+             method="indep", sampler="mc", geom=None, bbox=False,
+             incumbent=None, margin=0.0, stats=None, hw=None, N_max=None, n_rep=8,
+             dtype=np.float64, rng=None):
     """
     Estima F(cp) y la dirección u* que da el peor corte:
 
@@ -62,6 +661,53 @@ def ratio_cp(A, b, cp, z_vals, N_hip, d, N, tol=1e-9, batch=None, target_mb=None
 
     donde H_u es el hiperplano que pasa por cp con normal u (solo en coords continuas).
 
+    method : {"indep", "pool", "exact", "sweep"}
+        "indep": cada dirección y cada fibra usan un lote nuevo de N muestras.
+        "pool" : cada fibra se muestrea una sola vez; los puntos aceptados se
+                 reutilizan para todas las direcciones (números aleatorios comunes)
+                 y también dan el denominador sum_z Vol(S_z).
+        "exact": volúmenes exactos de S_z y de sus cortes: polígonos y shoelace
+                 en d = 2 (poly2d), vértices por HalfspaceIntersection y
+                 ConvexHull.volume en d >= 3 (fibers.FiberPolytope). N no se usa;
+                 las N_hip direcciones siguen siendo aleatorias.
+        "sweep": solo d = 2; áreas exactas y mínimo exacto sobre el ángulo de u
+                 (barrido por ángulos críticos, poly2d.worst_cut_sweep). N y N_hip
+                 no se usan.
+    sampler : {"mc", "sobol", "halton", "direct"}
+        Secuencia de puntos para los métodos Monte Carlo (ver samplers.py).
+        "direct" (solo con method="pool") muestrea N puntos uniformes dentro de
+        cada S_z vía triangulación, sin rechazo, y usa su volumen exacto.
+    geom : FiberGeometry o None
+        Estructura por fibra ya construida para (A, b, d, z_vals, N, sampler);
+        si se entrega se reutilizan sus volúmenes, muestras y polígonos. Si es
+        None se construye una nueva (comportamiento de una llamada aislada).
+    bbox : bool
+        Muestrear cada fibra solo dentro de su caja alineada a los ejes (los
+        conteos se reescalan por el volumen de la caja). Si se entrega geom,
+        manda geom.bbox.
+    incumbent, margin : float o None, float
+        Cota de poda: como F(cp) es un mínimo sobre direcciones, apenas alguna
+        dirección da un cociente < incumbent - margin el cp ya no puede superar al
+        incumbente y se deja de evaluar. El valor devuelto es entonces solo una
+        cota superior de F(cp). margin > 0 protege contra el ruido Monte Carlo.
+    stats : dict o None
+        Si se entrega, se llenan stats["n_dir"] (direcciones evaluadas),
+        stats["pruned"] (si se cortó por la cota), stats["stderr"] (error estándar
+        de F(cp): método delta en "pool", 0 en los exactos, NaN en "indep") y
+        stats["n_samples"] (muestras por fibra usadas).
+    hw, N_max : float o None, int o None
+        Precisión secuencial (ver FiberGeometry): con method="pool" los pools
+        crecen al doble hasta que 1.96 · stderr(F) <= hw o se llega a N_max. Si
+        se entrega geom, mandan geom.hw y geom.N_max.
+    n_rep : int
+        Con sampler "sobol" o "halton", scrambles independientes por fibra
+        (ver FiberGeometry); si se entrega geom, manda geom.n_rep.
+    dtype : np.float64 o np.float32
+        Precisión del test de pertenencia (ver MembershipKernel).
+    rng : numpy.random.Generator, semilla o None
+        Fuente de las direcciones (y de las muestras si geom es None). Si es
+        None y se entrega geom, se usa geom.rng.
+
     Devuelve
     --------
     worst_ratio : float
@@ -77,38 +723,59 @@ def ratio_cp(A, b, cp, z_vals, N_hip, d, N, tol=1e-9, batch=None, target_mb=None
         raise ValueError(f"A tiene {A.shape[1]} columnas; d={d} ⇒ 1+d={1+d}.")
     if cp.shape[0] != 1 + d:
         raise ValueError("cp debe tener dimensión 1+d (incluyendo la coordenada z).")
+    check_method(d, method, sampler)
 
     p_cp = cp[1:]  # parte continua del cp (en [0,1]^d idealmente)
 
-    # Precompute estructura por fibra (no depende de u)
-    Ap = A[:, 1:]  # (#ineq, d)
-    n_ineq = A.shape[0]
+    # Estructura por fibra (no depende de u ni de cp)
+    if geom is None:
+        rng = make_rng(rng)
+        geom = FiberGeometry(A, b, d, z_vals, N, tol=tol, batch=batch, target_mb=target_mb,
+                             sampler=sampler, bbox=bbox, hw=hw, N_max=N_max, n_rep=n_rep,
+                             dtype=dtype, rng=rng)
+    elif geom.d != d:
+        raise ValueError(f"geom tiene d={geom.d}; se esperaba d={d}.")
+    else:
+        rng = geom.rng if rng is None else make_rng(rng)
 
-    # Volumen total (denominador): sum_z Vol_rel(S_z)
-    vols = {}
-    for z in z_vals:
-        vols[int(z)] = _fiber_vol_est(d, A, b, z, N, tol=tol, batch=batch, target_mb=target_mb)
+    if stats is None:
+        stats = {}
+    stats["n_dir"] = 0
+    stats["pruned"] = False
+    stats["stderr"] = 0.0 if method in ("exact", "sweep") else np.nan
+    stats["n_samples"] = 0 if method in ("exact", "sweep") else geom.N
+    bound = -np.inf if incumbent is None else float(incumbent) - float(margin)
 
-    vol_total = sum(vols.values())
+    if method == "exact" and d != 2:
+        out = _ratio_cp_exact(geom, p_cp, z_vals, N_hip, bound=bound, stats=stats, rng=rng)
+        profiling.count("directions", stats["n_dir"])
+        return out
+
+    if method in ("exact", "sweep"):
+        out = _ratio_cp_exact2d(geom, p_cp, z_vals, N_hip, sweep=(method == "sweep"),
+                                bound=bound, stats=stats, rng=rng)
+        profiling.count("directions", stats["n_dir"])
+        return out
+
+    if method == "pool":
+        out = _ratio_cp_pool(geom, p_cp, z_vals, N_hip, target_mb=target_mb,
+                             bound=bound, stats=stats, rng=rng)
+        profiling.count("directions", stats["n_dir"])
+        return out
+
+    # Volumen total (denominador): sum_z Vol_rel(S_z); sin error estándar para F
+    # porque cada dirección usa muestras nuevas
+    vol_total = sum(geom.vol(z) for z in z_vals)
     if vol_total <= 0:
         # No hay volumen, devolvemos ratio 0 y un u neutro
         return 0.0, np.zeros(d, dtype=float)
 
-    # Tamaño de lote para el muestreo por dirección
-    if batch is None:
-        m_auto = _choose_batch(n_ineq, target_mb=target_mb)
-        batch = min(N, max(1000, m_auto))
-    else:
-        batch = int(batch)
-        if batch <= 0:
-            batch = min(N, max(1000, _choose_batch(n_ineq, target_mb=target_mb)))
-
     worst_ratio = 1.0  # buscamos el mínimo sobre direcciones
     best_u = None
 
     for _ in range(int(N_hip)):
         # normal aleatoria en R^d (solo sobre coords continuas)
-        u = np.random.randn(d)
+        u = rng.standard_normal(d)
         nu = np.linalg.norm(u)
         if nu < 1e-15:
             continue
@@ -118,17 +785,17 @@ def ratio_cp(A, b, cp, z_vals, N_hip, d, N, tol=1e-9, batch=None, target_mb=None
         sum_min_sides = 0.0
 
         for z in z_vals:
-            z_val = float(int(z))
-            b_shift = b - A[:, 0] * z_val  # (#ineq,)
+            kern = geom.kernel(z)  # buffers reutilizados entre direcciones
+            box_vol = geom.box(z)[2]
             acc_pos = 0
             acc_neg = 0
             gen = 0
+            draw = None if sampler == "mc" else make_sampler(sampler, d, rng=rng)
 
-            # Monte Carlo por lotes en p ~ U([0,1]^d)
-            while gen < N:
-                m = min(batch, N - gen)
-                p = np.random.rand(m, d)
-                inside = np.all((p @ Ap.T) <= (b_shift + tol), axis=1)
+            # Monte Carlo (o QMC) por lotes en p ~ U(caja de S_z)
+            while gen < N and box_vol > 0:
+                m = min(kern.batch, N - gen)
+                p, inside = kern.sample(m, draw, rng=rng)
                 if inside.any():
                     side_val = (p[inside] - p_cp) @ u  # (k,)
                     acc_pos += int((side_val >= 0).sum())
@@ -137,18 +804,265 @@ def ratio_cp(A, b, cp, z_vals, N_hip, d, N, tol=1e-9, batch=None, target_mb=None
 
             acc_tot = acc_pos + acc_neg
             if acc_tot > 0:
-                min_side = min(acc_pos, acc_neg) / float(N)
+                min_side = box_vol * min(acc_pos, acc_neg) / float(N)
             else:
                 min_side = 0.0
 
             sum_min_sides += min_side
 
         ratio_u = sum_min_sides / max(vol_total, 1e-16)
+        stats["n_dir"] += 1
         if ratio_u < worst_ratio:
             worst_ratio = ratio_u
             best_u = u.copy()
+            if worst_ratio < bound:
+                stats["pruned"] = True
+                break
 
     if best_u is None:
         best_u = np.zeros(d, dtype=float)
 
+    profiling.count("directions", stats["n_dir"])
+    return float(worst_ratio), best_u
+
+
+def _ratio_cp_pool(geom, p_cp, z_vals, N_hip, target_mb=None, bound=-np.inf, stats=None,
+                   rng=None):
+    """
+    Variante "pool" de ratio_cp: una muestra aceptada por fibra (geom.pool),
+    compartida por todas las direcciones, que se evalúan en bloque con
+    _min_sides_batched. Con geom.hw, los pools se duplican (geom.extend) y se
+    reevalúan las mismas direcciones hasta alcanzar la precisión pedida.
+    Misma salida que ratio_cp.
+    """
+    d = geom.d
+
+    # Todas las direcciones de una vez: columnas unitarias de U (d, N_hip)
+    U = _random_directions(d, N_hip, rng=rng)
+
+    while True:
+        pools = []
+        vol_total = 0.0
+        for z in z_vals:
+            pts, w = geom.pool(z)
+            # centramos en cp una sola vez: el lado de cada punto es (p - p_cp) · u
+            pools.append((pts - p_cp, w))
+            vol_total += pts.shape[0] * w
+
+        if vol_total <= 0:
+            return 0.0, np.zeros(d, dtype=float)
+        if U.shape[1] == 0:
+            return 1.0, np.zeros(d, dtype=float)
+
+        worst_ratio, best_u = _min_over_blocks(
+            U, lambda Uj: _min_sides_batched(pools, Uj, target_mb=target_mb) / max(vol_total, 1e-16),
+            bound=bound, stats=stats,
+        )
+        se = _pool_ratio_stderr(geom, pools, z_vals, best_u, worst_ratio, vol_total)
+        if stats is not None:
+            stats["stderr"] = se
+            stats["n_samples"] = geom.N
+
+        done = (geom.hw is None or _Z95 * se <= geom.hw or geom.N >= geom.N_max
+                or (stats is not None and stats["pruned"]))
+        if done:
+            return worst_ratio, best_u
+        geom.extend(min(2 * geom.N, geom.N_max))
+
+
+def _pool_ratio_stderr(geom, pools, z_vals, u, F, vol_total):
+    """
+    Error estándar (método delta) de F = sum_z m_z / sum_z v_z en la dirección u.
+
+    Por fibra, con n muestras y escala s (volumen de la caja, o de S_z si el
+    muestreo es directo): m_z = s·p_z y v_z = s·q_z, donde p_z es la fracción de
+    muestras en el lado menor y q_z la fracción aceptada. Como el lado menor
+    está contenido en los aceptados, Cov(m_z, v_z) = s² p_z (1 - q_z) / n.
+
+    Con sampler QMC esas fórmulas (de muestras iid) sobrestiman mucho el error;
+    se usa en cambio la dispersión entre scrambles (_pool_rep_stderr).
+    """
+    if vol_total <= 0:
+        return 0.0
+    if geom.sampler in _QMC:
+        return _pool_rep_stderr(geom, pools, z_vals, u)
+    var_num = var_den = cov = 0.0
+    for z, (pts_c, _w) in zip(z_vals, pools):
+        n, s = geom.pool_counts(z)
+        if n <= 0 or s <= 0:
+            continue
+        k = pts_c.shape[0]
+        pos = int(np.count_nonzero(pts_c @ u >= 0))
+        p = min(pos, k - pos) / float(n)
+        q = k / float(n)
+        var_num += s * s * p * (1.0 - p) / n
+        var_den += s * s * q * (1.0 - q) / n
+        cov += s * s * p * (1.0 - q) / n
+    var = (var_num - 2.0 * F * cov + F * F * var_den) / (vol_total * vol_total)
+    return float(np.sqrt(max(var, 0.0)))
+
+
+def _pool_rep_stderr(geom, pools, z_vals, u):
+    """
+    Error estándar de F en la dirección u con pools QMC (geom.pool_reps): F_r
+    con las muestras del scramble r (el lado menor de cada fibra se fija con
+    el pool completo) y std(F_r) / sqrt(n_rep).
+    """
+    R = geom.n_rep
+    num = np.zeros(R)
+    den = np.zeros(R)
+    for z, (pts_c, _w) in zip(z_vals, pools):
+        reps = geom.pool_reps(z)
+        n, s = geom.pool_counts(z)
+        if reps is None or n <= 0 or s <= 0:
+            continue
+        labels, n_r = reps
+        pos = pts_c @ u >= 0
+        side = pos if 2 * int(np.count_nonzero(pos)) <= pos.shape[0] else ~pos
+        w_r = s / np.maximum(n_r, 1)
+        num += w_r * np.bincount(labels[side], minlength=R)
+        den += w_r * np.bincount(labels, minlength=R)
+    F_r = num / np.maximum(den, 1e-16)
+    return float(np.std(F_r, ddof=1) / np.sqrt(R))
+
+
+def _ratio_cp_exact2d(geom, p_cp, z_vals, N_hip, sweep=False, bound=-np.inf, stats=None,
+                      rng=None):
+    """
+    Variantes "exact" / "sweep" de ratio_cp para d = 2: polígono por fibra y áreas
+    por shoelace. Con sweep=False se evalúan N_hip direcciones aleatorias de una vez;
+    con sweep=True se minimiza exactamente sobre el ángulo (sin poda: el barrido
+    no usa direcciones aleatorias y stats["n_dir"] queda en 0). Misma salida que
+    ratio_cp.
+    """
+    polys = []
+    vol_total = 0.0
+    for z in z_vals:
+        P, area = geom.polygon(z)
+        if area > 0:
+            polys.append((P, area))
+            vol_total += area
+
+    if vol_total <= 0:
+        return 0.0, np.zeros(2, dtype=float)
+
+    if sweep:
+        g_min, best_u = worst_cut_sweep(polys, p_cp)
+        return min(1.0, g_min / vol_total), best_u
+
+    U = _random_directions(2, N_hip, rng=rng)
+    if U.shape[1] == 0:
+        return 1.0, np.zeros(2, dtype=float)
+
+    def _ratios(Uj):
+        sum_min_sides = np.zeros(Uj.shape[1], dtype=float)
+        for P, area in polys:
+            pos = np.clip(split_areas(P, p_cp, Uj), 0.0, area)
+            sum_min_sides += np.minimum(pos, area - pos)
+        return sum_min_sides / vol_total
+
+    return _min_over_blocks(U, _ratios, bound=bound, stats=stats)
+
+
+def _ratio_cp_exact(geom, p_cp, z_vals, N_hip, bound=-np.inf, stats=None, rng=None):
+    """
+    Variante "exact" de ratio_cp para d >= 3: volumen de cada S_z y de sus cortes
+    con fibers.FiberPolytope (vértices y aristas una vez por fibra, un
+    ConvexHull por corte). Las N_hip direcciones son aleatorias. Misma salida
+    que ratio_cp.
+
+    Si Qhull no pudo con alguna fibra (FiberPolytope.valid = False) no hay
+    volumen exacto: se usa la variante "pool" con N muestras por fibra y
+    stats["stderr"] / stats["n_samples"] quedan como en ella.
+    """
+    polys = [geom.polytope(z) for z in z_vals]
+    if not all(P.valid for P in polys):
+        profiling.count("exact_fallback")
+        stats["n_samples"] = geom.N
+        return _ratio_cp_pool(geom, p_cp, z_vals, N_hip, target_mb=geom.target_mb,
+                              bound=bound, stats=stats, rng=rng)
+    polys = [P for P in polys if P.volume > 0]
+    vol_total = sum(P.volume for P in polys)
+    if vol_total <= 0:
+        return 0.0, np.zeros(geom.d, dtype=float)
+
+    U = _random_directions(geom.d, N_hip, rng=rng)
+    if U.shape[1] == 0:
+        return 1.0, np.zeros(geom.d, dtype=float)
+
+    def _ratios(Uj):
+        sum_min_sides = np.zeros(Uj.shape[1], dtype=float)
+        for P in polys:
+            pos = P.cut_volumes(p_cp, Uj)
+            sum_min_sides += np.minimum(pos, P.volume - pos)
+        return sum_min_sides / vol_total
+
+    return _min_over_blocks(U, _ratios, bound=bound, stats=stats)
+
+
+def _min_over_blocks(U, ratios_fn, bound=-np.inf, stats=None):
+    """
+    min_j ratios_fn(U)[j] y su columna de U. Sin cota (bound = -inf) se evalúa
+    todo en una llamada; con cota se avanza en bloques de _PRUNE_BLOCK direcciones
+    y se corta apenas el mínimo parcial cae bajo bound.
+    """
+    n_dir = U.shape[1]
+    block = n_dir if not np.isfinite(bound) else _PRUNE_BLOCK
+
+    worst_ratio = 1.0
+    best_u = np.zeros(U.shape[0], dtype=float)
+    for j0 in range(0, n_dir, block):
+        Uj = U[:, j0:j0 + block]
+        ratios = ratios_fn(Uj)
+        if stats is not None:
+            stats["n_dir"] += Uj.shape[1]
+        j = int(np.argmin(ratios))
+        if ratios[j] < worst_ratio:
+            worst_ratio = float(ratios[j])
+            best_u = Uj[:, j].copy()
+        if worst_ratio < bound:
+            if stats is not None:
+                stats["pruned"] = True
+            break
+
     return float(worst_ratio), best_u
+
+
+def _random_directions(d, n, rng=None):
+    """Matriz (d, n) de direcciones unitarias ~ U(S^{d-1}); descarta normas ~0."""
+    U = make_rng(rng).standard_normal((d, int(n)))
+    nu = np.linalg.norm(U, axis=0)
+    keep = nu >= 1e-15
+    return U[:, keep] / nu[keep]
+
+
+def _min_sides_batched(pools, U, target_mb=None):
+    """
+    Para cada columna u de U (d, n_dir) calcula sum_z min(Vol^+, Vol^-) a partir
+    de los pools centrados en cp: lista de (pts_c, w) con pts_c = pts - p_cp y
+    w el volumen que representa cada punto (1 / n_gen con rechazo).
+
+    Por fibra se hace un GEMM (k, d) @ (d, cols) y se cuentan los lados por
+    columna. Las direcciones se procesan en bloques para que la matriz de
+    proyecciones respete target_mb (misma regla que _choose_batch).
+    """
+    n_dir = U.shape[1]
+    out = np.zeros(n_dir, dtype=float)
+
+    k_max = max((pts_c.shape[0] for pts_c, _w in pools), default=0)
+    if k_max == 0:
+        return out
+    cols = min(n_dir, _choose_batch(k_max, target_mb=target_mb))
+
+    for j0 in range(0, n_dir, cols):
+        Uj = U[:, j0:j0 + cols]
+        for pts_c, w in pools:
+            k = pts_c.shape[0]
+            if k == 0:
+                continue
+            proj = pts_c @ Uj                           # (k, cols)
+            acc_pos = np.count_nonzero(proj >= 0, axis=0)
+            acc_neg = k - acc_pos
+            out[j0:j0 + cols] += np.minimum(acc_pos, acc_neg) * w
+
+    return out